@@ -0,0 +1,270 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+from flask import jsonify, request
+from cache import FigureCache, memoize_figure
+from data_cube import get_data_cube
+from indicators import INDICATORS, get_indicator
+from metrics import timed
+
+# Trends and correlations across years, straight from the data cube:
+#   - per-country time series of an indicator with year-over-year changes
+#   - Pearson / Spearman correlation matrices between every pair of indicators over the
+#     (country, year) observations both have, of the values or of their yearly changes
+# Everything works on whole (indicator, country, year) arrays and the results are cached
+# as JSON, keyed by the data versions, so a repeated request is a cache hit. They have
+# their own LRU (ANALYTICS_CACHE_SIZE): the api takes arbitrary country lists and year
+# ranges, which must not push the maps out of the figure cache.
+#
+# The dashboard shows the correlation heatmap and the time series of the selected pair for
+# the country last clicked on the map.
+#
+# JSON routes (see init_analytics):
+#   /api/series/<indicator>?countries=DEU,FRA
+#   /api/correlations?method=pearson|spearman&values=level|change&start=2015&end=2024
+
+CORRELATION_METHODS = ('pearson', 'spearman')
+CORRELATION_VALUES = ('level', 'change')
+MIN_PERIODS = 3  # pairs with fewer common observations get no correlation
+
+analytics_cache = FigureCache(int(os.environ.get('ANALYTICS_CACHE_SIZE', 128)))
+
+
+def yoy_changes(values, years):
+    # (absolute, percent) change from the previous year along the last axis; NaN for the
+    # first year, after a gap in years and wherever either year has no value
+    change = np.full(values.shape, np.nan)
+    consecutive = np.diff(years) == 1
+    change[..., 1:] = np.where(consecutive, np.diff(values, axis=-1), np.nan)
+    previous = np.full(values.shape, np.nan)
+    previous[..., 1:] = values[..., :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = np.where(previous != 0, change / np.abs(previous) * 100, np.nan)
+    return change, percent
+
+
+def rank_average(values):
+    # 1-based ranks, ties get the mean of their ranks (what Spearman uses)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    return (ends - (counts - 1) / 2.0)[inverse]
+
+
+def pearson_matrix(x, min_periods=MIN_PERIODS):
+    # x is (variables, observations) with NaN where a variable has no value; returns the
+    # correlation of every pair over the observations both have and the number of them
+    valid = ~np.isnan(x)
+    present = valid.astype(np.float64)
+    # standardize each variable first: the correlations stay the same and the sums below
+    # don't lose precision on large values (tourism nights)
+    count = valid.sum(axis=1, keepdims=True)
+    mean = np.where(valid, x, 0.0).sum(axis=1, keepdims=True) / np.maximum(count, 1)
+    scale = np.sqrt(np.where(valid, (x - mean) ** 2, 0.0).sum(axis=1, keepdims=True) / np.maximum(count, 1))
+    scale[scale == 0] = 1.0
+    z = np.where(valid, (x - mean) / scale, 0.0)
+
+    # [i, j] sums over the observations where both i and j have a value
+    n = present @ present.T
+    sum_i = z @ present.T
+    sum_ii = (z * z) @ present.T
+    sum_ij = z @ z.T
+
+    cov = n * sum_ij - sum_i * sum_i.T
+    var = (n * sum_ii - sum_i ** 2) * (n * sum_ii.T - sum_i.T ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.clip(cov / np.sqrt(var), -1.0, 1.0)
+    r[(n < min_periods) | ~(var > 1e-12)] = np.nan
+    return r, n.astype(int)
+
+
+def spearman_matrix(x, min_periods=MIN_PERIODS):
+    # Spearman is Pearson on the ranks, but the ranks depend on which observations a pair
+    # shares, so every pair is ranked over its own common observations
+    valid = ~np.isnan(x)
+    k = len(x)
+    r = np.full((k, k), np.nan)
+    n = np.zeros((k, k), dtype=int)
+    for i in range(k):
+        for j in range(i, k):
+            both = valid[i] & valid[j]
+            n[i, j] = n[j, i] = both.sum()
+            if n[i, j] < min_periods:
+                continue
+            ranks = np.vstack([rank_average(x[i, both]), rank_average(x[j, both])])
+            r[i, j] = r[j, i] = pearson_matrix(ranks, min_periods)[0][0, 1]
+    return r, n
+
+
+def year_range(cube, start=None, end=None):
+    # positions on the cube's year axis between start and end (inclusive)
+    years = cube.years
+    lo = years[0] if start is None else start
+    hi = years[-1] if end is None else end
+    return np.flatnonzero((years >= lo) & (years <= hi))
+
+
+def json_values(values, digits=None):
+    # list with None for NaN (which JSON doesn't have)
+    values = np.asarray(values, dtype=np.float64)
+    if digits is not None:
+        values = np.round(values, digits)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def create_correlations(method='pearson', values='level', start=None, end=None):
+    cube = get_data_cube()
+    cols = year_range(cube, start, end)
+    data = cube.values
+    if values == 'change':
+        data, _ = yoy_changes(data, cube.years)
+    # every (country, year) is one observation
+    x = data[:, :, cols].reshape(len(cube.indicators), -1)
+    with timed('dashboard_stage_seconds', callback='create_correlations', stage=method):
+        if method == 'spearman':
+            r, n = spearman_matrix(x)
+        else:
+            r, n = pearson_matrix(x)
+    years = cube.years[cols]
+    return {
+        'method': method,
+        'values': values,
+        'years': [int(years[0]), int(years[-1])] if len(years) else [],
+        'indicators': cube.indicators,
+        'labels': [INDICATORS[key]['label'] for key in cube.indicators],
+        'r': json_values(r, 4),
+        'n': n.tolist()
+    }
+
+
+def create_series(indicator, isos=()):
+    # yearly values of one indicator for the given countries (all with data if empty)
+    cube = get_data_cube()
+    values = cube.values[cube.indicator_index[indicator]]
+    if isos:
+        rows = np.flatnonzero(np.isin(cube.isos, isos))
+    else:
+        rows = np.flatnonzero(~np.isnan(values).all(axis=1))
+    change, percent = yoy_changes(values[rows], cube.years)
+    return {
+        'indicator': indicator,
+        'title': INDICATORS[indicator]['title'],
+        'years': cube.years.tolist(),
+        'countries': [
+            {
+                'iso': cube.isos[row],
+                'name': cube.names[row],
+                'values': json_values(values[row]),
+                'change': json_values(change[i], 6),
+                'percent_change': json_values(percent[i], 4)
+            }
+            for i, row in enumerate(rows)
+        ]
+    }
+
+
+def create_correlation_heatmap(method, values, start=None, end=None):
+    corr = create_correlations(method, values, start, end)
+    what = "yearly changes" if values == 'change' else "values"
+    years = f" ({corr['years'][0]}-{corr['years'][1]})" if corr['years'] else ""
+    fig = go.Figure(go.Heatmap(
+        z=corr['r'],
+        x=corr['labels'],
+        y=corr['labels'],
+        zmin=-1,
+        zmax=1,
+        colorscale='RdBu',
+        customdata=corr['n'],
+        texttemplate='%{z:.2f}',
+        hovertemplate='%{y} / %{x}<br>r = %{z:.3f}<br>%{customdata} observations<extra></extra>'
+    ))
+    fig.update_layout(
+        title=f"{method.capitalize()} correlation of the {what}{years}",
+        yaxis=dict(autorange='reversed'),
+        margin=dict(t=60)
+    )
+    return fig
+
+
+def create_time_series(x_var, secondary_var, iso, start=None, end=None):
+    # both indicators of the map for one country, on their own y axes
+    base = get_indicator(x_var, axis='x')
+    secondary = get_indicator(secondary_var, axis='y')
+    cube = get_data_cube()
+    rows = np.flatnonzero(cube.isos == iso)
+    if base is None or secondary is None or not len(rows):
+        return go.Figure(layout=dict(title="No data available."))
+    cols = year_range(cube, start, end)
+    years = cube.years[cols].tolist()
+    row = rows[0]
+    fig = go.Figure()
+    for i, (key, entry) in enumerate([(x_var, base), (secondary_var, secondary)]):
+        fig.add_trace(go.Scatter(
+            x=years,
+            y=json_values(cube.values[cube.indicator_index[key], row, cols]),
+            name=entry['title'],
+            mode='lines+markers',
+            yaxis='y2' if i else 'y'
+        ))
+    fig.update_layout(
+        title=f"{cube.names[row]}: {base['title']} and {secondary['title']}",
+        yaxis=dict(title=base['title']),
+        yaxis2=dict(title=secondary['title'], overlaying='y', side='right'),
+        legend=dict(orientation='h', y=-0.15),
+        margin=dict(t=60)
+    )
+    return fig
+
+
+def all_indicators(*_):
+    return list(INDICATORS)
+
+
+def series_indicators(indicator, *_):
+    return (indicator,)
+
+
+def pair_indicators(x_var, secondary_var, *_):
+    return (x_var, secondary_var)
+
+
+cached_correlations = memoize_figure(create_correlations, depends=all_indicators, store=analytics_cache)
+cached_series = memoize_figure(create_series, depends=series_indicators, store=analytics_cache)
+cached_correlation_heatmap = memoize_figure(create_correlation_heatmap, depends=all_indicators, store=analytics_cache)
+cached_time_series = memoize_figure(create_time_series, depends=pair_indicators, store=analytics_cache)
+
+
+def clamp_years(cube, start=None, end=None):
+    # the first and last of the cube's years inside the requested range (missing ends are
+    # open), so equivalent ranges share one cache entry; None if it holds none of them
+    years = cube.years[year_range(cube, start, end)]
+    if not len(years):
+        return None
+    return int(years[0]), int(years[-1])
+
+
+def init_analytics(server):
+    @server.route('/api/series/<indicator>')
+    def _series(indicator):
+        if get_indicator(indicator) is None:
+            return jsonify(error=f"unknown indicator {indicator!r}"), 404
+        countries = request.args.get('countries', '')
+        requested = {iso.strip().upper() for iso in countries.split(',') if iso.strip()}
+        # only countries the cube has, in one order, so the cache key is canonical
+        isos = tuple(sorted(requested.intersection(get_data_cube().isos.tolist())))
+        if requested and not isos:
+            return jsonify(error="none of the countries has data"), 404
+        return jsonify(cached_series(indicator, isos))
+
+    @server.route('/api/correlations')
+    def _correlations():
+        method = request.args.get('method', 'pearson')
+        values = request.args.get('values', 'level')
+        if method not in CORRELATION_METHODS:
+            return jsonify(error=f"method must be one of {', '.join(CORRELATION_METHODS)}"), 400
+        if values not in CORRELATION_VALUES:
+            return jsonify(error=f"values must be one of {', '.join(CORRELATION_VALUES)}"), 400
+        years = clamp_years(get_data_cube(), request.args.get('start', type=int), request.args.get('end', type=int))
+        if years is None:
+            return jsonify(error="no data between start and end"), 400
+        return jsonify(cached_correlations(method, values, *years))
@@ -1,36 +1,142 @@
+import logging
+import os
+
 import dash
-from dash import Input, Output
-from layout import get_layout
-from color_logic import create_bivariate_map, create_2d_legend_figure
-from cache import cache  # import the shared cache
+from dash import ClientsideFunction, Input, Output
+from layout import DEFAULT_COUNTRY, YEARS, get_layout
+from analytics import cached_correlation_heatmap, cached_time_series, init_analytics
+from classing import per_year
+from color_logic import SINGLE_TRACE_MAP, cached_bivariate_map, cached_bivariate_frames, cached_2d_legend_figure
+from background import background_manager, render_once
+from cache import cache, get_cache_config  # import the shared cache
+from geometry import init_geometry
+from metrics import init_metrics
+from responses import init_responses
+from warmup import warm_up_from_env
+from watcher import init_watcher
 
 from flask import Flask
 
+logging.basicConfig(level=logging.INFO)
+
 # create a Flask server and a Dash app that uses it
 server = Flask(__name__)
 app = dash.Dash(__name__, server=server)
 
-# initialise the cache with the Flask server and configuration
-cache.init_app(server, config={'CACHE_TYPE': 'simple'})
+# initialise the cache with the Flask server, the backend comes from the environment
+# (CACHE_TYPE=simple|filesystem|redis, see cache.get_cache_config)
+cache.init_app(server, config=get_cache_config())
+
+# request timings, loader/callback stage timings and cache hit rates on /metrics
+init_metrics(server)
+
+# DATA_WATCH=1 picks up changed csvs in data/ without a restart (see watcher.py)
+init_watcher(server)
+
+# country outlines for SINGLE_TRACE_MAP=1, served once and cached by the browser
+init_geometry(server)
+
+# gzip/brotli compression and ETags/304s for GET responses (and, with CALLBACK_ETAGS=1,
+# for callbacks replayed by API clients); the salt covers settings that change the
+# figures for the same inputs
+init_responses(server, salt=f'single_trace={SINGLE_TRACE_MAP}')
+
+# json api for time series and correlation matrices
+init_analytics(server)
 
 app.layout = get_layout()
 
-@app.callback(
-    Output('choropleth-graph', 'figure'),
-    [Input('variable-dropdown', 'value'),
-     Input('x-variable-dropdown', 'value'),
-     Input('year-slider', 'value')]
+# BACKGROUND_CALLBACKS=1 renders the figures in background jobs instead of in the
+# request, identical concurrent jobs render once (see background.py)
+BACKGROUND = background_manager()
+
+def callback_options(graph_id):
+    # extra app.callback arguments: background mode dims the graph while the job runs
+    if BACKGROUND is None:
+        return {}
+    return {
+        'background': True,
+        'manager': BACKGROUND,
+        'running': [(Output(graph_id, 'className'), 'figure-updating', '')]
+    }
+
+def get_figure(cached, *args):
+    return render_once(cached, *args) if BACKGROUND is not None else cached(*args)
+
+# CLIENTSIDE_YEARS=1 sends every year of a variable pair at once and lets the
+# browser switch years (assets/map_frames.js) instead of asking the server per year
+CLIENTSIDE_YEARS = os.environ.get('CLIENTSIDE_YEARS', '').lower() in ('1', 'true')
+
+if CLIENTSIDE_YEARS:
+    @app.callback(
+        Output('map-frames', 'data'),
+        [Input('variable-dropdown', 'value'),
+         Input('x-variable-dropdown', 'value'),
+         Input('classing-dropdown', 'value')],
+        **callback_options('choropleth-graph')
+    )
+    def update_map_frames_callback(secondary_var, x_var, classing):
+        return get_figure(cached_bivariate_frames, x_var, secondary_var, tuple(YEARS), classing)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='maps', function_name='render_year'),
+        Output('choropleth-graph', 'figure'),
+        [Input('map-frames', 'data'),
+         Input('year-slider', 'value')]
+    )
+else:
+    @app.callback(
+        Output('choropleth-graph', 'figure'),
+        [Input('variable-dropdown', 'value'),
+         Input('x-variable-dropdown', 'value'),
+         Input('year-slider', 'value'),
+         Input('classing-dropdown', 'value')],
+        **callback_options('choropleth-graph')
+    )
+    def update_bivariate_map_callback(secondary_var, x_var, year, classing):
+        return get_figure(cached_bivariate_map, x_var, secondary_var, year, classing)
+
+# only per-year classes change the legend with the year: the browser passes the year on
+# to the legend just for those, so other classings don't cost a request per slider move
+app.clientside_callback(
+    ClientsideFunction(namespace='maps', function_name='legend_year'),
+    Output('legend-year', 'data'),
+    [Input('year-slider', 'value'),
+     Input('classing-dropdown', 'value')]
 )
-def update_bivariate_map_callback(secondary_var, x_var, year):
-    return create_bivariate_map(x_var, secondary_var, year)
 
 @app.callback(
     Output('legend-graph', 'figure'),
     [Input('x-variable-dropdown', 'value'),
-     Input('variable-dropdown', 'value')]
+     Input('variable-dropdown', 'value'),
+     Input('classing-dropdown', 'value'),
+     Input('legend-year', 'data')],
+    **callback_options('legend-graph')
+)
+def update_legend_callback(x_var, secondary_var, classing, year):
+    return get_figure(cached_2d_legend_figure, x_var, secondary_var, classing, year if per_year(classing) else None)
+
+@app.callback(
+    Output('correlation-graph', 'figure'),
+    [Input('correlation-method', 'value'),
+     Input('correlation-values', 'value')]
 )
-def update_legend_callback(x_var, secondary_var):
-    return create_2d_legend_figure(x_var, secondary_var)
+def update_correlation_callback(method, values):
+    return cached_correlation_heatmap(method, values, min(YEARS), max(YEARS))
+
+@app.callback(
+    Output('time-series-graph', 'figure'),
+    [Input('x-variable-dropdown', 'value'),
+     Input('variable-dropdown', 'value'),
+     Input('choropleth-graph', 'clickData')]
+)
+def update_time_series_callback(x_var, secondary_var, click_data):
+    iso = click_data['points'][0].get('location') if click_data else None
+    return cached_time_series(x_var, secondary_var, iso or DEFAULT_COUNTRY, min(YEARS), max(YEARS))
+
+# optionally load the data (and render every figure) before accepting traffic;
+# with `gunicorn --preload` this runs once in the master and the workers inherit it
+warm_up_from_env(server)
 
 if __name__ == "__main__":
     app.run_server(debug=True)
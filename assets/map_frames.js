@@ -0,0 +1,65 @@
+// Clientside year switching for the bivariate map.
+// The server sends one payload per (x, secondary) pair (color_logic.create_bivariate_frames)
+// and moving the year slider only rebuilds the figure here, without a server round-trip.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    maps: {
+        render_year: function(payload, year) {
+            if (!payload) {
+                return window.dash_clientside.no_update;
+            }
+            var frame = payload.frames[String(year)];
+            var layout = {
+                title: {text: payload.title + (frame ? ' (' + year + ')' : '')},
+                geo: {scope: 'europe'},
+                showlegend: false,
+                margin: {t: 60}
+            };
+            if (!frame || frame.idx.length === 0) {
+                return {data: [], layout: layout};
+            }
+
+            // one trace for every country: z is the country's position and the
+            // colorscale maps each position onto that country's own colour
+            var n = frame.idx.length;
+            var locations = [], names = [], z = [], customdata = [], colorscale = [];
+            for (var i = 0; i < n; i++) {
+                var k = frame.idx[i];
+                locations.push(payload.locations[k]);
+                names.push(payload.names[k]);
+                z.push(i + 0.5);
+                customdata.push([frame.x[i], frame.y ? frame.y[i] : null]);
+                colorscale.push([i / n, frame.colors[i]], [(i + 1) / n, frame.colors[i]]);
+            }
+            var yText = frame.y ? '%{customdata[1]}' : 'N/A';
+            var trace = {
+                type: 'choropleth',
+                locations: locations,
+                z: z,
+                zmin: 0,
+                zmax: n,
+                colorscale: colorscale,
+                showscale: false,
+                hovertext: names,
+                customdata: customdata,
+                hovertemplate: '<b>%{hovertext}</b><br>' + payload.x_label + ': %{customdata[0]}<br>' +
+                    payload.y_label + ': ' + yText + '<extra></extra>'
+            };
+            if (payload.geojson) {
+                // SINGLE_TRACE_MAP: the bundled outlines, fetched once and cached by the browser
+                trace.geojson = payload.geojson;
+                trace.featureidkey = 'id';
+            }
+            return {data: [trace], layout: layout};
+        },
+
+        // year for the legend, only while the classing has breakpoints per year (the
+        // '-year' classings, see classing.py); with any other classing moving the slider
+        // doesn't ask the server for a legend
+        legend_year: function(year, classing) {
+            if (classing && classing.slice(-5) === '-year') {
+                return year;
+            }
+            return window.dash_clientside.no_update;
+        }
+    }
+});
@@ -0,0 +1,72 @@
+import logging
+import os
+import tempfile
+
+from cache import json_loads
+
+try:
+    import diskcache
+    from dash import DiskcacheManager
+except ImportError:  # optional, callbacks then run in the request like before
+    diskcache = None
+
+logger = logging.getLogger(__name__)
+
+# BACKGROUND_CALLBACKS=1 runs the figure callbacks as Dash background callbacks: the request
+# returns at once, the job runs in its own process and the browser polls for the result,
+# so a slow render doesn't hold a gunicorn worker. The page keeps showing the previous
+# figure (dimmed, see assets/background.css) until the new one arrives.
+#
+# Jobs and results live in a diskcache directory shared by every worker on the machine
+# (BACKGROUND_CACHE_DIR). Identical jobs running at the same time render the figure once:
+# the first takes a lock, the others wait for it and read its result.
+
+BACKGROUND_CACHE_DIR = os.environ.get(
+    'BACKGROUND_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'europe-dashboard-jobs')
+)
+RESULT_EXPIRE = 3600  # seconds a rendered figure is kept for other jobs
+LOCK_EXPIRE = 300     # a crashed job's lock is released after this many seconds
+
+_store = None
+
+
+def job_store():
+    global _store
+    if _store is None:
+        _store = diskcache.Cache(BACKGROUND_CACHE_DIR)
+    return _store
+
+
+def background_manager():
+    # DiskcacheManager when BACKGROUND_CALLBACKS is on, None for plain callbacks
+    if os.environ.get('BACKGROUND_CALLBACKS', '').lower() not in ('1', 'true'):
+        return None
+    if diskcache is None:
+        logger.warning("BACKGROUND_CALLBACKS needs diskcache (pip install 'dash[diskcache]'), "
+                       "running callbacks in the request")
+        return None
+    return DiskcacheManager(job_store())
+
+
+def run_once(key, compute):
+    # compute() once across every process for concurrent callers with the same key
+    store = job_store()
+    result = store.get(key)
+    if result is not None:
+        return result
+    with diskcache.Lock(store, f'lock:{key}', expire=LOCK_EXPIRE):
+        result = store.get(key)
+        if result is None:
+            result = compute()
+            store.set(key, result, expire=RESULT_EXPIRE)
+    return result
+
+
+def render_once(cached, *args):
+    # what cached(*args) returns (a memoize_figure function), for a background job: from
+    # the figure cache the job inherited, else rendered once for all identical jobs
+    key = cached.cache_key(*args)
+    fig_json = cached.store.get(key)
+    if fig_json is None:
+        fig_json = run_once(repr(key), lambda: cached.render(*args))
+    return json_loads(fig_json)
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmarks for the loaders, the color engine, the figure builders and the analytics
+# (plus the memory held by each loaded dataset).
+#
+#   python -m benchmarks.run                               # real data, print a summary
+#   python -m benchmarks.run --scale 1 --scale 10 --scale 100 -o results.json
+#   python -m benchmarks.run --compare benchmarks/baseline.json
+#   python -m benchmarks.run --save-baseline               # rewrite benchmarks/baseline.json
+#
+# Every scale runs in a fresh process against its own copy of the csvs (see synthetic.py)
+# and its own snapshot directory, so nothing in data/ is touched. The cache backend comes
+# from CACHE_TYPE like in the app. With --compare the exit status is 1 if any metric got
+# slower (or bigger) than the baseline by more than the tolerance.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+
+def measure(func, repeat):
+    # wall time of `repeat` calls in seconds
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def stats(samples, unit='s'):
+    return {
+        'unit': unit,
+        'n': len(samples),
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'max': max(samples),
+    }
+
+
+def run_benchmarks(repeat, years):
+    # imported here so DATA_DIR / SNAPSHOT_DIR from the environment are picked up
+    from flask import Flask
+
+    import numpy as np
+    from analytics import CORRELATION_METHODS, cached_correlations, create_correlations
+    from cache import cache, get_cache_config
+    from color_logic import (cached_2d_legend_figure, cached_bivariate_map, classing_breaks, compute_colors,
+                             compute_final_color, create_2d_legend_figure, create_bivariate_map)
+    from data_cube import build_data_cube, cube_slice, get_data_cube
+    from data_loaders import load_all, load_indicator, memory_report
+    from indicators import INDICATORS, indicator_options
+    from snapshots import SNAPSHOT_DIR
+
+    server = Flask(__name__)
+    cache.init_app(server, config=get_cache_config())
+
+    def clear_snapshots():
+        shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+
+    metrics = {}
+    combos = {}
+    samples = {}
+
+    def add(name, values, unit='s'):
+        samples.setdefault(name, ([], unit))[0].extend(values)
+
+    with server.app_context():
+        # loaders: cold = csv parse + snapshot write, snapshot = frame read from the
+        # memory-mapped snapshot (no parsing), warm = cache.memoize hit
+        for key in INDICATORS:
+            for _ in range(repeat):
+                clear_snapshots()
+                cache.clear()
+                add(f'loader.{key}.cold', measure(lambda: load_indicator(key), 1))
+                cache.clear()
+                add(f'loader.{key}.snapshot', measure(lambda: load_indicator(key), 1))
+                add(f'loader.{key}.warm', measure(lambda: load_indicator(key), 1))
+        for _ in range(repeat):
+            clear_snapshots()
+            cache.clear()
+            add('load_all.cold', measure(load_all, 1))
+            cache.clear()
+            add('load_all.snapshot', measure(load_all, 1))
+            add('load_all.warm', measure(load_all, 1))
+
+        # in-memory and cache-entry size of each loaded dataset
+        for key, usage in memory_report().items():
+            add(f'memory.{key}.bytes', [usage['bytes']], unit='bytes')
+            add(f'memory.{key}.cache_bytes', [usage['cache_bytes']], unit='bytes')
+
+        add('data_cube.build', measure(build_data_cube, repeat))
+        cube = get_data_cube()
+
+        x_vars = [opt['value'] for opt in indicator_options('x')]
+        secondary_vars = [opt['value'] for opt in indicator_options('y')]
+        years = years or [int(y) for y in cube.years if 2015 <= y <= 2024]
+
+        # color engine: one compute_final_color call per country vs one compute_colors call,
+        # and the class lookup of a data-driven classing
+        for x_var in x_vars:
+            for secondary in secondary_vars:
+                for year in years:
+                    x_values = cube_slice(cube, x_var, year)
+                    y_values = cube_slice(cube, secondary, year)
+                    mask = ~np.isnan(x_values) & ~np.isnan(y_values)
+                    xs, ys = x_values[mask], y_values[mask]
+                    if not mask.any():
+                        continue
+                    add('color.per_row', measure(
+                        lambda: [compute_final_color(x, y, x_var, secondary) for x, y in zip(xs, ys)], repeat))
+                    add('color.batch', measure(lambda: compute_colors(xs, ys, x_var, secondary), repeat))
+                    breaks = classing_breaks(cube, x_var, secondary, 'quantile-year', year)
+                    add('color.classed', measure(lambda: compute_colors(xs, ys, x_var, secondary, breaks=breaks), repeat))
+                    add('color.points', [int(mask.sum())], unit='count')
+
+        # legends
+        for x_var in x_vars:
+            for secondary in secondary_vars:
+                add('legend.build', measure(lambda: create_2d_legend_figure(x_var, secondary), repeat))
+                fig = create_2d_legend_figure(x_var, secondary)
+                add('legend.serialize', measure(fig.to_json, repeat))
+                add('legend.bytes', [len(fig.to_json())], unit='bytes')
+                cached_2d_legend_figure.store.clear()
+                cached_2d_legend_figure(x_var, secondary)
+                add('legend.cached', measure(lambda: cached_2d_legend_figure(x_var, secondary), repeat))
+
+        # maps, end to end: building the figure plus serializing it like the callback does
+        for x_var in x_vars:
+            for secondary in secondary_vars:
+                for year in years:
+                    build = measure(lambda: create_bivariate_map(x_var, secondary, year), repeat)
+                    fig = create_bivariate_map(x_var, secondary, year)
+                    serialize = measure(fig.to_json, repeat)
+                    size = len(fig.to_json())
+                    cached_bivariate_map.store.clear()
+                    cached_bivariate_map(x_var, secondary, year)
+                    cached = measure(lambda: cached_bivariate_map(x_var, secondary, year), repeat)
+                    add('map.build', build)
+                    add('map.serialize', serialize)
+                    add('map.end_to_end', [b + s for b, s in zip(build, serialize)])
+                    add('map.cached', cached)
+                    add('map.bytes', [size], unit='bytes')
+                    combos[f'{x_var}/{secondary}/{year}'] = {
+                        'build': statistics.median(build),
+                        'serialize': statistics.median(serialize),
+                        'bytes': size,
+                    }
+
+        # correlation matrices over every indicator pair, computed and from the figure cache
+        for method in CORRELATION_METHODS:
+            add(f'analytics.{method}.build', measure(lambda: create_correlations(method), repeat))
+            cached_correlations.store.clear()
+            cached_correlations(method, 'level', None, None)
+            add(f'analytics.{method}.cached',
+                measure(lambda: cached_correlations(method, 'level', None, None), repeat))
+
+    for name, (values, unit) in samples.items():
+        metrics[name] = stats(values, unit)
+    return {'metrics': metrics, 'maps': combos}
+
+
+def run_scale(scale, repeat, years):
+    # run one scale in a child process against a scaled copy of the data
+    from benchmarks.synthetic import scale_data_dir
+
+    workdir = tempfile.mkdtemp(prefix=f'dashboard-bench-{scale}x-')
+    try:
+        data_dir = os.path.join(workdir, 'data')
+        rows = scale_data_dir(data_dir, scale)
+        out = os.path.join(workdir, 'result.json')
+        env = dict(os.environ, DATA_DIR=data_dir, SNAPSHOT_DIR=os.path.join(workdir, 'snapshots'))
+        cmd = [sys.executable, '-m', 'benchmarks.run', '--worker', out, '--repeat', str(repeat)]
+        for year in years or []:
+            cmd += ['--year', str(year)]
+        subprocess.run(cmd, cwd=ROOT, env=env, check=True)
+        with open(out) as f:
+            result = json.load(f)
+        result['rows'] = rows
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline, tolerance, size_tolerance, min_delta):
+    # list of regressions: (scale, metric, baseline median, current median)
+    regressions = []
+    for scale, result in current['scales'].items():
+        base = baseline.get('scales', {}).get(scale)
+        if base is None:
+            continue
+        for name, now in result['metrics'].items():
+            then = base['metrics'].get(name)
+            if then is None or now['unit'] == 'count':
+                continue
+            allowed = size_tolerance if now['unit'] == 'bytes' else tolerance
+            delta = now['median'] - then['median']
+            if now['unit'] == 's' and delta < min_delta:
+                continue  # too small to tell apart from noise
+            if now['median'] > then['median'] * (1 + allowed):
+                regressions.append((scale, name, then['median'], now['median']))
+        # payload sizes are deterministic, so check every map on its own too
+        for combo, now in result['maps'].items():
+            then = base.get('maps', {}).get(combo)
+            if then is not None and now['bytes'] > then['bytes'] * (1 + size_tolerance):
+                regressions.append((scale, f'map.bytes[{combo}]', then['bytes'], now['bytes']))
+    return regressions
+
+
+def format_value(value, unit):
+    if unit == 's':
+        return f'{value * 1000:10.3f} ms'
+    return f'{value:10.0f} {unit}'
+
+
+def print_summary(results, baseline=None):
+    for scale, result in results['scales'].items():
+        print(f"\nscale {scale}x ({sum(result['rows'].values())} csv rows)")
+        base = (baseline or {}).get('scales', {}).get(scale, {}).get('metrics', {})
+        for name, m in result['metrics'].items():
+            line = f"  {name:32} median {format_value(m['median'], m['unit'])}   min {format_value(m['min'], m['unit'])}"
+            if name in base and base[name]['median']:
+                line += f"   x{m['median'] / base[name]['median']:.2f} vs baseline"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loaders, color engine and figure builders")
+    parser.add_argument('--scale', type=int, action='append',
+                        help="csv row multiplier, may be repeated (default 1)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per measurement")
+    parser.add_argument('--year', type=int, action='append',
+                        help="only benchmark these years (default 2015-2024)")
+    parser.add_argument('-o', '--output', help="write the results as json")
+    parser.add_argument('--compare', metavar='BASELINE', help="flag regressions against a results file")
+    parser.add_argument('--save-baseline', action='store_true', help=f"write the results to {BASELINE}")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown of a median time (default 0.25 = 25%%)")
+    parser.add_argument('--size-tolerance', type=float, default=0.01,
+                        help="allowed growth of a payload size (default 0.01 = 1%%)")
+    parser.add_argument('--min-delta', type=float, default=0.0005,
+                        help="ignore slowdowns smaller than this many seconds")
+    parser.add_argument('--worker', metavar='OUT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, 'w') as f:
+            json.dump(run_benchmarks(args.repeat, args.year), f)
+        return 0
+
+    results = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'years': args.year,
+        },
+        'scales': {}
+    }
+    for scale in args.scale or [1]:
+        results['scales'][str(scale)] = run_scale(scale, args.repeat, args.year)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+
+    for path in filter(None, [args.output, BASELINE if args.save_baseline else None]):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"\nresults written to {path}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.size_tolerance, args.min_delta)
+        for scale, name, then, now in regressions:
+            print(f"REGRESSION {scale}x {name}: {then:.6g} -> {now:.6g}")
+        if regressions:
+            return 1
+        print("\nno regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
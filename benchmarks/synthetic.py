@@ -0,0 +1,55 @@
+import argparse
+import os
+import shutil
+
+# Synthetic data for the benchmarks: every csv in data/ scaled to `factor` times its rows.
+# The data rows are repeated as-is, so 'mean' indicators aggregate to exactly the same
+# values as the real data (only 'sum' indicators, i.e. epidemic, grow with the factor)
+# and the maps stay comparable across scales.
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def scale_csv(src, dest, factor):
+    with open(src, 'rb') as f:
+        header = f.readline()
+        body = f.read()
+    if body and not body.endswith(b'\n'):
+        body += b'\n'
+    with open(dest, 'wb') as f:
+        f.write(header)
+        for _ in range(factor):
+            f.write(body)
+
+
+def scale_data_dir(dest_dir, factor, source_dir=SOURCE_DIR):
+    # write every csv of source_dir into dest_dir with `factor` times the rows;
+    # returns the number of data rows per file
+    os.makedirs(dest_dir, exist_ok=True)
+    rows = {}
+    for name in sorted(os.listdir(source_dir)):
+        if not name.endswith('.csv'):
+            continue
+        src = os.path.join(source_dir, name)
+        dest = os.path.join(dest_dir, name)
+        if factor == 1:
+            shutil.copyfile(src, dest)
+        else:
+            scale_csv(src, dest, factor)
+        rows[name] = count_rows(dest)
+    return rows
+
+
+def count_rows(path):
+    # data rows (without the header) of a csv
+    with open(path, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the csvs in data/ scaled to N times their rows")
+    parser.add_argument('factor', type=int, help="row multiplier, e.g. 10 or 100")
+    parser.add_argument('dest', help="output directory (use it with DATA_DIR=<dest>)")
+    args = parser.parse_args()
+    for name, count in scale_data_dir(args.dest, args.factor).items():
+        print(f"{name}: {count} rows")
@@ -1,3 +1,343 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+from cachelib.serializers import BaseSerializer, RedisSerializer
 from flask_caching import Cache
+from flask_caching.backends import FileSystemCache, RedisCache, SimpleCache
+from indicators import get_indicator
+from metrics import inc, timed
+from versions import indicator_version
+
+try:
+    import orjson
+    json_loads = orjson.loads  # a lot faster on figure-sized json
+except ImportError:
+    json_loads = json.loads
+
+cache = Cache()
+
+# DataFrames are stored as a small json header followed by the raw column buffers
+# instead of a pickled pandas object; everything else still goes through pickle, and so
+# does a frame with columns or an index that have no compact encoding (TypeError below).
+# Bump the magic whenever the layout changes.
+FRAME_MAGIC = b'\x00DF2'
+
+
+def _pack(header, arrays):
+    # header: json-able frame description, arrays: name -> numpy array
+    layout = []
+    offset = 0
+    for name, arr in arrays.items():
+        layout.append([name, arr.dtype.str, arr.shape, offset])
+        offset += arr.nbytes
+    head = json.dumps({**header, 'arrays': layout}).encode()
+    parts = [FRAME_MAGIC, len(head).to_bytes(4, 'little'), head]
+    parts.extend(np.ascontiguousarray(arr).tobytes() for arr in arrays.values())
+    return b''.join(parts)
+
+
+def _unpack(data):
+    start = len(FRAME_MAGIC) + 4
+    head_len = int.from_bytes(data[len(FRAME_MAGIC):start], 'little')
+    head = json.loads(data[start:start + head_len])
+    body = start + head_len
+    arrays = {}
+    for name, dtype, shape, offset in head.pop('arrays'):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=body + offset).reshape(shape)
+    return head, arrays
+
+
+def _plain_array(values):
+    # numeric / datetime numpy data can go out as raw bytes, python objects can't
+    return isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufcmM'
+
+
+def frame_to_bytes(df):
+    if not df.columns.is_unique or not all(isinstance(name, str) for name in df.columns):
+        raise TypeError("column names must be unique strings")
+    arrays = {}
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        key = f'c{i}'
+        if _plain_array(col):
+            arrays[key] = col.to_numpy()
+            columns.append([name, 'numeric'])
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            categories = col.cat.categories
+            if not (_plain_array(categories) or categories.inferred_type == 'string'):
+                raise TypeError(f"column {name!r} has categories without a compact encoding")
+            arrays[key] = col.cat.codes.to_numpy()
+            arrays[key + 'categories'] = categories.to_numpy() if _plain_array(categories) else np.asarray(categories, dtype=str)
+            columns.append([name, 'category', bool(col.cat.ordered)])
+        elif isinstance(col.dtype, pd.StringDtype):
+            # text is dictionary-encoded: codes + unique values, -1 marks a missing value;
+            # object columns are left to pickle, they may hold anything
+            codes, uniques = pd.factorize(col)
+            arrays[key] = codes.astype(np.int32)
+            arrays[key + 'uniques'] = np.asarray(uniques, dtype=str)
+            columns.append([name, 'text', str(col.dtype)])
+        else:
+            raise TypeError(f"column {name!r} has no compact encoding")
+
+    index = df.index
+    if isinstance(index, pd.RangeIndex):
+        index_info = ['range', index.start, index.stop, index.step]
+    elif isinstance(index.dtype, np.dtype) and index.dtype.kind in 'biuf':
+        arrays['index'] = index.to_numpy()
+        index_info = ['values']
+    else:
+        raise TypeError(f"index of dtype {index.dtype} has no compact encoding")
+    return _pack({'columns': columns, 'index': index_info, 'index_name': index.name}, arrays)
+
+
+def frame_from_bytes(data):
+    header, arrays = _unpack(data)
+    columns = {}
+    for i, (name, kind, *extra) in enumerate(header['columns']):
+        key = f'c{i}'
+        if kind == 'category':
+            columns[name] = pd.Categorical.from_codes(arrays[key], arrays[key + 'categories'], ordered=extra[0])
+        elif kind == 'text':
+            codes = arrays[key]
+            values = arrays[key + 'uniques'].astype(object)[codes]
+            values[codes == -1] = None
+            columns[name] = pd.array(values, dtype=extra[0])
+        else:
+            columns[name] = arrays[key]
+    kind, *bounds = header['index']
+    if kind == 'range':
+        index = pd.RangeIndex(*bounds, name=header['index_name'])
+    else:
+        index = pd.Index(arrays['index'], name=header['index_name'])
+    return pd.DataFrame(columns, index=index)
+
+
+class FrameSerializerMixin:
+    def dumps(self, value, *args, **kwargs):
+        if isinstance(value, pd.DataFrame):
+            try:
+                return frame_to_bytes(value)
+            except TypeError:
+                pass  # odd dtypes, fall back to pickle
+        return super().dumps(value, *args, **kwargs)
+
+    def loads(self, bvalue, *args, **kwargs):
+        if isinstance(bvalue, bytes) and bvalue.startswith(FRAME_MAGIC):
+            return frame_from_bytes(bvalue)
+        return super().loads(bvalue, *args, **kwargs)
+
+    def dump(self, value, f, *args, **kwargs):
+        f.write(self.dumps(value))
+
+    def load(self, f, *args, **kwargs):
+        return self.loads(f.read())
+
+
+class FrameSerializer(FrameSerializerMixin, BaseSerializer):
+    pass
+
+
+class FrameRedisSerializer(FrameSerializerMixin, RedisSerializer):
+    pass
+
+
+MEMOIZE_VERSION_SUFFIX = '_memver'  # flask-caching's per-function version keys
+
+
+class CountingCacheMixin:
+    # hit/miss counts for the /metrics endpoint (memoize looks values up with get);
+    # memoize also fetches its version key on every call and the filesystem cache reads
+    # its file count through get, those aren't data lookups
+    def get(self, key):
+        value = super().get(key)
+        if not key.endswith(MEMOIZE_VERSION_SUFFIX) and key != getattr(self, '_fs_count_file', None):
+            inc('dashboard_cache_requests_total', cache='data', result='miss' if value is None else 'hit')
+        return value
+
+
+# backends that share entries between gunicorn workers (and survive worker restarts)
+class FrameSimpleCache(CountingCacheMixin, SimpleCache):
+    serializer = FrameSerializer()
+
+
+class FrameFileSystemCache(CountingCacheMixin, FileSystemCache):
+    serializer = FrameSerializer()
+
+
+class FrameRedisCache(CountingCacheMixin, RedisCache):
+    serializer = FrameRedisSerializer()
+
+
+CACHE_BACKENDS = {
+    'simple': 'cache.FrameSimpleCache',          # per process, the old behaviour
+    'filesystem': 'cache.FrameFileSystemCache',  # shared through CACHE_DIR
+    'redis': 'cache.FrameRedisCache'             # shared through CACHE_REDIS_URL (redis/valkey/...)
+}
+
+
+def get_cache_config():
+    # pick the cache backend from the environment, e.g. CACHE_TYPE=filesystem
+    backend = os.environ.get('CACHE_TYPE', 'simple').lower()
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"unknown CACHE_TYPE {backend!r}, expected one of {sorted(CACHE_BACKENDS)}")
+
+    config = {
+        'CACHE_TYPE': CACHE_BACKENDS[backend],
+        'CACHE_DEFAULT_TIMEOUT': int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 3600)),
+        'CACHE_THRESHOLD': int(os.environ.get('CACHE_THRESHOLD', 500))
+    }
+    if backend == 'filesystem':
+        config['CACHE_DIR'] = os.environ.get(
+            'CACHE_DIR', os.path.join(tempfile.gettempdir(), 'europe-dashboard-cache')
+        )
+    elif backend == 'redis':
+        config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        config['CACHE_KEY_PREFIX'] = os.environ.get('CACHE_KEY_PREFIX', 'europe-dashboard:')
+    return config
+
+
+FIGURE_CACHES = []  # every FigureCache, so a data reload goes through all of them
+
+
+class FigureCache:
+    # in-process LRU of serialized figure JSON; keys carry the data versions the figure
+    # was built from, so entries for old data simply stop being asked for
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        FIGURE_CACHES.append(self)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def discard(self, predicate):
+        # drop every entry whose key matches predicate, returns how many were dropped
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def figure_cache_size(default):
+    # FIGURE_CACHE_SIZE, if set, overrides the size of every figure cache
+    return int(os.environ.get('FIGURE_CACHE_SIZE') or default)
+
+
+# default store of memoize_figure; the maps, frames and legends have their own,
+# sized for their key space (see color_logic)
+figure_cache = FigureCache(figure_cache_size(256))
+
+# cached figure functions by name, so entries can be rendered again after a data reload
+FIGURE_FUNCS = {}
+
+
+def figure_key(func, args, depends=None):
+    # (name, args, ((indicator, version), ...)) for the indicators the figure reads
+    indicators = depends(*args) if depends is not None else ()
+    versions = tuple((key, indicator_version(key)) for key in indicators if get_indicator(key) is not None)
+    return (func.__name__, tuple(args), versions)
+
+
+def figure_dependents(indicators):
+    # (cached function, args) of every cached figure that reads one of the indicators
+    found = []
+    for store in FIGURE_CACHES:
+        for name, args, versions in store.keys():
+            if any(key in indicators for key, _ in versions) and (name, args) not in found:
+                found.append((name, args))
+    return [(FIGURE_FUNCS[name], args) for name, args in found]
+
+
+def discard_figures(predicate):
+    # drop the entries matching predicate from every figure cache, returns how many
+    return sum(store.discard(predicate) for store in FIGURE_CACHES)
+
+
+_inflight = {}  # key -> Future of a computation that is running right now
+_inflight_lock = threading.Lock()
+
+
+def single_flight(key, compute):
+    # run compute() once for concurrent callers with the same key: the first one computes,
+    # the others wait for it and share its result (or its exception)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        inc('dashboard_single_flight_waits_total')
+        return future.result()
+    try:
+        result = compute()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+def memoize_figure(func, depends=None, store=None):
+    # cache the figure (or plain dict) returned by func as JSON; the wrapper returns a dict.
+    # depends(*args) names the indicators the figure is built from (None: it reads no data),
+    # store is the FigureCache to keep them in (figure_cache by default)
+    store = figure_cache if store is None else store
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = figure_key(func, args, depends)
+        fig_json = store.get(key)
+        inc('dashboard_cache_requests_total', cache='figure', result='miss' if fig_json is None else 'hit')
+        if fig_json is None:
+            # identical requests arriving while this one renders wait for it
+            fig_json = single_flight(key, lambda: render_and_store(key, args))
+        return json_loads(fig_json)
+
+    def render(*args):
+        result = func(*args)
+        with timed('dashboard_stage_seconds', callback=func.__name__, stage='serialize'):
+            return result.to_json() if hasattr(result, 'to_json') else json.dumps(result)
+
+    def render_and_store(key, args):
+        fig_json = render(*args)
+        store.set(key, fig_json)
+        return fig_json
 
-cache = Cache()
\ No newline at end of file
+    wrapper.render = render
+    wrapper.store = store
+    wrapper.cache_key = lambda *args: figure_key(func, args, depends)
+    FIGURE_FUNCS[func.__name__] = wrapper
+    return wrapper
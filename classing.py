@@ -0,0 +1,119 @@
+import warnings
+
+import numpy as np
+
+# Data-driven color classes. Instead of normalizing each value onto its color axis with the
+# fixed registry range, every indicator's values are cut into CLASS_COUNT classes, by
+# quantiles or by natural breaks (Jenks), from the values of the same year or of all
+# years. The breakpoints are computed with the data cube and stored on it, so the map,
+# the frames and the legend all use the same ones and a lookup is one searchsorted.
+#
+# A classing is one of CLASSINGS: 'range' (the registry ranges, the default) or
+# '<method>-<period>' with method 'quantile' or 'jenks' and period 'year' or 'all'.
+
+CLASS_COUNT = 5
+JENKS_SAMPLE = 1000  # larger inputs are reduced to this many quantiles first
+
+CLASSINGS = {
+    'range': "Fixed ranges",
+    'quantile-year': "Quantiles per year",
+    'quantile-all': "Quantiles over all years",
+    'jenks-year': "Natural breaks per year",
+    'jenks-all': "Natural breaks over all years",
+}
+DEFAULT_CLASSING = 'range'
+
+
+def parse_classing(classing):
+    # (method, period), or None for the fixed ranges (and anything unknown)
+    if classing not in CLASSINGS or classing == 'range':
+        return None
+    method, period = classing.split('-')
+    return method, period
+
+
+def per_year(classing):
+    parsed = parse_classing(classing)
+    return parsed is not None and parsed[1] == 'year'
+
+
+def quantile_breaks(values, classes=CLASS_COUNT, axis=-1):
+    # the classes - 1 inner quantiles along axis (moved last), NaN where there's no data
+    q = np.arange(1, classes) / classes
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN slices
+        breaks = np.nanquantile(values, q, axis=axis)
+    return np.moveaxis(breaks, 0, -1)
+
+
+def jenks_breaks(values, classes=CLASS_COUNT):
+    # Fisher-Jenks natural breaks of a 1-d array: the lower bounds of classes 2..classes that
+    # minimizes the squared deviations within the classes (dynamic programming over the
+    # sorted values, one vectorized step per class)
+    values = np.sort(values[~np.isnan(values)])
+    if len(values) > JENKS_SAMPLE:
+        values = np.quantile(values, np.linspace(0, 1, JENKS_SAMPLE))
+    n = len(values)
+    if n < classes:
+        return quantile_breaks(values, classes) if n else np.full(classes - 1, np.nan)
+
+    s1 = np.concatenate([[0.0], np.cumsum(values)])
+    s2 = np.concatenate([[0.0], np.cumsum(values * values)])
+    # ssd[i, j]: squared deviations of values[i:j], inf unless i < j
+    i = np.arange(n + 1)[:, np.newaxis]
+    j = np.arange(n + 1)[np.newaxis, :]
+    size = j - i
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ssd = (s2[j] - s2[i]) - (s1[j] - s1[i]) ** 2 / size
+    ssd[size <= 0] = np.inf
+
+    # cost[j]: smallest total for values[:j] in the classes so far,
+    # starts[k][j]: where the last of k + 2 classes over values[:j] starts
+    cost = ssd[0]
+    starts = []
+    for _ in range(classes - 1):
+        total = cost[:, np.newaxis] + ssd
+        starts.append(np.argmin(total, axis=0))
+        cost = total[starts[-1], np.arange(n + 1)]
+
+    breaks = []
+    end = n
+    for start in reversed(starts):
+        end = start[end]
+        breaks.append(values[end])
+    return np.array(breaks[::-1])
+
+
+def compute_breaks(values, classes=CLASS_COUNT):
+    # breakpoints of every classing for a (indicator, country, year) array:
+    # (method, 'year') -> (indicator, year, classes - 1), (method, 'all') -> (indicator, classes - 1)
+    indicators, _, years = values.shape
+    pooled = values.reshape(indicators, -1)
+    return {
+        ('quantile', 'year'): quantile_breaks(values, classes, axis=1),
+        ('quantile', 'all'): quantile_breaks(pooled, classes, axis=1),
+        ('jenks', 'year'): np.array([[jenks_breaks(values[i, :, j], classes) for j in range(years)]
+                                     for i in range(indicators)]).reshape(indicators, years, classes - 1),
+        ('jenks', 'all'): np.array([jenks_breaks(row, classes) for row in pooled]).reshape(indicators, classes - 1),
+    }
+
+
+def cube_breaks(cube, indicator, classing, year=None):
+    # breakpoints of one indicator for a classing (and the year, for per-year ones);
+    # None for the fixed ranges, an indicator the cube doesn't have or a cube without breaks
+    parsed = parse_classing(classing)
+    i = cube.indicator_index.get(indicator)
+    if parsed is None or i is None or cube.breaks is None:
+        return None
+    breaks = cube.breaks[parsed][i]
+    if parsed[1] == 'year':
+        j = cube.year_index.get(year)
+        if j is None:
+            return np.full(breaks.shape[-1], np.nan)
+        breaks = breaks[j]
+    return breaks
+
+
+def classify(values, breaks):
+    # class of every value, 0 .. len(breaks); a value equal to a breakpoint goes up
+    return np.searchsorted(breaks, values, side='right')
@@ -1,31 +1,24 @@
+import functools
+import os
+
 import numpy as np
+import pandas as pd
 import plotly.express as px
-from data_loaders import (
-    load_gdp_data,
-    load_gdp_per_capita_data,
-    load_health_expenditure_data,
-    load_life_expectancy_data,
-    load_economic_sentiment,
-    load_epidemic_data,
-    load_employment_rate_data,
-    load_tourism_data,
-    load_tourism_nights_data,
-    safe_float,
-    iso_to_country_name
-)
-
-#secondary ranges for datasets (y-axis)
+import plotly.graph_objects as go
+from cache import FigureCache, figure_cache_size, memoize_figure
+from classing import CLASS_COUNT, DEFAULT_CLASSING, CLASSINGS, classify, cube_breaks, parse_classing, per_year
+from data_cube import get_data_cube, cube_slice
+from geometry import geojson_url
+from indicators import get_indicator, indicator_options
+from layout import YEARS
+from metrics import timed
+
+#secondary ranges for datasets (y-axis), from the indicator registry
 def get_secondary_range(dataset):
-    ranges = {
-        'health': (0, 10000, "Health Expenditure"),
-        'lifeexp': (50, 90, "Life Expectancy"),
-        'epidemic': (0, 300, "Epidemic Cases"),
-        'econ': (50, 150, "Economic Sentiment"),
-        'employment': (50, 100, "Employment Rate"),
-        'tourism': (0, 100, "Personal Tourism (%)"),
-        'tourism_nights': (0, 500000000, "Tourism Nights")
-    }
-    return ranges.get(dataset, (0, 1, "Secondary Value"))
+    spec = get_indicator(dataset, axis='y')
+    if spec is None:
+        return (0, 1, "Secondary Value")
+    return (*spec['range'], spec['title'])
 
 # Bilinear Interpolation - GPT GENERATED!!!!
 def bilinear_interpolate(x, y, c00, c10, c01, c11):
@@ -37,86 +30,107 @@ def bilinear_interpolate(x, y, c00, c10, c01, c11):
          c01[2]*(1 - x)*y + c11[2]*x*y)
     return (int(round(r)), int(round(g)), int(round(b)))
 
-# Compute final color for a given data point
-def compute_final_color(x_val, other, x_var='gdp_growth', secondary='health'):
-    # Normalize x based on chosen x_var
-    if x_var == 'gdp_growth':
-        # Assume GDP Growth is in range -10 to 10
-        x_norm = (x_val + 10) / 20.0
-    elif x_var == 'gdp_per_capita':
-        # Now assume GDP Per Capita is in range 0 to 90,000 (Euro per capita)
-        x_norm = x_val / 90000.0
-    else:
-        x_norm = 0
-    x_norm = min(max(x_norm, 0), 1)
-    
-    # Normalize y from secondary variable range
+# Vectorized version of bilinear_interpolate: x and y are arrays of normalized
+# values, returns the rounded r, g, b channels as int arrays.
+def bilinear_interpolate_array(x, y, c00, c10, c01, c11):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    channels = []
+    for k in range(3):
+        # same term order as bilinear_interpolate so results match bit for bit
+        v = (c00[k]*(1 - x)*(1 - y) + c10[k]*x*(1 - y) +
+             c01[k]*(1 - x)*y + c11[k]*x*y)
+        channels.append(np.clip(np.rint(v), 0, 255).astype(np.uint8))
+    return tuple(channels)
+
+# Corner colors of the bivariate palette:
+# Bottom-left = white, bottom-right = blue,
+# Top-left = red, top-right = magenta.
+C00 = (255, 255, 255)
+C10 = (0, 0, 255)
+C01 = (255, 0, 0)
+C11 = (255, 0, 255)
+
+HEX_BYTES = np.array([f'{i:02x}' for i in range(256)])
+
+def rgb_to_hex(r, g, b):
+    return np.char.add(np.char.add(np.char.add('#', HEX_BYTES[r]), HEX_BYTES[g]), HEX_BYTES[b])
+
+# Normalize x values to [0, 1] based on the range of the chosen x_var
+def normalize_x(x_values, x_var):
+    x_values = np.asarray(x_values, dtype=float)
+    spec = get_indicator(x_var, axis='x')
+    if spec is None:
+        return np.zeros_like(x_values)
+    x_min, x_max = spec['range']
+    return np.clip((x_values - x_min) / (x_max - x_min), 0, 1)
+
+# Normalize y values to [0, 1] from the secondary variable range
+def normalize_y(y_values, secondary):
     other_min, other_max, _ = get_secondary_range(secondary)
-    y_norm = (other - other_min) / (other_max - other_min)
-    y_norm = min(max(y_norm, 0), 1)
-    
-    # Define corners:
-    # Bottom-left = white, bottom-right = blue,
-    # Top-left = red, top-right = magenta.
-    c00 = (255, 255, 255)
-    c10 = (0, 0, 255)
-    c01 = (255, 0, 0)
-    c11 = (255, 0, 255)
-    
-    (r, g, b) = bilinear_interpolate(x_norm, y_norm, c00, c10, c01, c11)
-    r = min(max(r, 0), 255)
-    g = min(max(g, 0), 255)
-    b = min(max(b, 0), 255)
-    return f'#{r:02x}{g:02x}{b:02x}'
+    y_norm = (np.asarray(y_values, dtype=float) - other_min) / (other_max - other_min)
+    return np.clip(y_norm, 0, 1)
 
-# Create the 2D legend figure.
-# Now accepts x_var to update the x-axis label and ticks.
-def create_2d_legend_figure(x_var, user_var=''):
-    # Define the same corner colors as above.
-    c00 = (255, 255, 255)  # bottom-left: white
-    c10 = (0, 0, 255)      # bottom-right: blue
-    c01 = (255, 0, 0)      # top-left: red
-    c11 = (255, 0, 255)    # top-right: magenta
+# Compute the colors for arrays of data points in one pass.
+# x_values and y_values must be finite, returns an array of hex strings.
+# With breaks=(x_breaks, y_breaks) the values are classed instead (see classing.py).
+def compute_colors(x_values, y_values, x_var='gdp_growth', secondary='health', breaks=None):
+    if breaks is not None:
+        return classed_colors(x_values, y_values, *breaks)
+    r, g, b = bilinear_interpolate_array(
+        normalize_x(x_values, x_var), normalize_y(y_values, secondary), C00, C10, C01, C11
+    )
+    return rgb_to_hex(r, g, b)
 
-    secondary_min, secondary_max, secondary_label = get_secondary_range(user_var)
-    
-    # Determine x-axis label and ticks based on x_var.
-    if x_var == 'gdp_growth':
-        x_label = "GDP Growth (%)"
-        x_ticks_actual = [-10, -5, 0, 5, 10]
-        x_ticks_norm = [(val + 10) / 20 for val in x_ticks_actual]
-    elif x_var == 'gdp_per_capita':
-        x_label = "GDP Per Capita (Euro)"
-        # New range: 0 to 90,000; set 5 tick marks.
-        x_ticks_actual = [0, 22500, 45000, 67500, 90000]
-        x_ticks_norm = [val / 90000 for val in x_ticks_actual]
-    else:
-        x_label = "X Value"
-        x_ticks_actual = [0, 0.25, 0.5, 0.75, 1]
-        x_ticks_norm = x_ticks_actual
+# Compute final color for a given data point
+def compute_final_color(x_val, other, x_var='gdp_growth', secondary='health'):
+    return str(compute_colors([x_val], [other], x_var=x_var, secondary=secondary)[0])
 
-    grid_size = 100
+# RGB image of the legend gradient, y=0 is the bottom row when origin='lower'.
+# It only depends on the grid size and corner colors, so it is built once.
+@functools.lru_cache(maxsize=8)
+def legend_image(grid_size=100, corners=(C00, C10, C01, C11)):
     x_vals = np.linspace(0, 1, grid_size)
     y_vals = np.linspace(0, 1, grid_size)
-    img = np.zeros((grid_size, grid_size, 3), dtype=np.uint8)
-    for i, x_norm in enumerate(x_vals):
-        for j, y_norm in enumerate(y_vals):
-            row_index = j  # so y=0 => bottom row when origin='lower'
-            img[row_index, i, :] = bilinear_interpolate(x_norm, y_norm, c00, c10, c01, c11)
+    # broadcast columns (x) against rows (y) to get every pixel in one pass
+    r, g, b = bilinear_interpolate_array(x_vals[np.newaxis, :], y_vals[:, np.newaxis], *corners)
+    img = np.stack([r, g, b], axis=-1)
+    img.setflags(write=False)
+    return img
+
+# Hex colors of the class grid, [y class, x class]: the palette sampled at evenly
+# spaced points, so the lowest and highest classes get the corner colors.
+@functools.lru_cache(maxsize=8)
+def class_colors(classes=CLASS_COUNT, corners=(C00, C10, C01, C11)):
+    img = legend_image(classes, corners)
+    return rgb_to_hex(img[..., 0], img[..., 1], img[..., 2])
+
+# Colors from class breakpoints: two searchsorted lookups and a table lookup per point.
+def classed_colors(x_values, y_values, x_breaks, y_breaks):
+    table = class_colors(len(x_breaks) + 1)
+    return table[classify(y_values, y_breaks), classify(x_values, x_breaks)]
 
+# (x breakpoints, y breakpoints) of the pair for a classing, None for the fixed ranges.
+def classing_breaks(cube, x_var, secondary_var, classing, year=None):
+    if parse_classing(classing) is None:
+        return None
+    x_breaks = cube_breaks(cube, x_var, classing, year)
+    y_breaks = cube_breaks(cube, secondary_var, classing, year)
+    if x_breaks is None or y_breaks is None:
+        return None
+    return x_breaks, y_breaks
+
+# Legend figure without any axis labels or ticks, cached per grid size and corners.
+# Callers must copy it before changing anything.
+@functools.lru_cache(maxsize=8)
+def legend_base_figure(grid_size=100, corners=(C00, C10, C01, C11)):
+    axis_vals = np.linspace(0, 1, grid_size)
     fig = px.imshow(
-        img,
+        legend_image(grid_size, corners),
         origin='lower',
-        x=x_vals,
-        y=y_vals,
-        labels=dict(x=x_label, y=secondary_label)
+        x=axis_vals,
+        y=axis_vals
     )
-    fig.update_xaxes(tickmode='array', tickvals=x_ticks_norm, ticktext=[str(val) for val in x_ticks_actual])
-    
-    y_ticks_actual = np.linspace(secondary_min, secondary_max, 5)
-    y_ticks_norm = [(val - secondary_min) / (secondary_max - secondary_min) for val in y_ticks_actual]
-    fig.update_yaxes(tickmode='array', tickvals=y_ticks_norm, ticktext=[f'{val:.0f}' for val in y_ticks_actual])
-    
     fig.update_layout(
         title="Continuous 2D Legend (Blended Axes)",
         showlegend=False,
@@ -124,100 +138,264 @@ def create_2d_legend_figure(x_var, user_var=''):
     )
     return fig
 
-# Create the bivariate map figure.
-def create_bivariate_map(x_var, secondary_var, year):
-    # Load baseline data based on x_var.
-    if x_var == 'gdp_growth':
-        baseline_data = load_gdp_data()
-        base_col = "gdp_value"
-        base_label = "GDP Growth (%)"
-    elif x_var == 'gdp_per_capita':
-        baseline_data = load_gdp_per_capita_data()
-        base_col = "gdp_per_capita"
-        base_label = "GDP Per Capita (Euro)"
-    else:
-        return px.choropleth(title="No data available.")
+# Legend of the class grid, one cell per (x class, y class), cached per class count and corners.
+# Callers must copy it before changing anything.
+@functools.lru_cache(maxsize=8)
+def classed_legend_base_figure(classes=CLASS_COUNT, corners=(C00, C10, C01, C11)):
+    axis_vals = np.arange(1, classes + 1)
+    fig = px.imshow(
+        legend_image(classes, corners),
+        origin='lower',
+        x=axis_vals,
+        y=axis_vals
+    )
+    fig.update_layout(showlegend=False, margin=dict(l=0, r=0, t=40, b=0))
+    return fig
+
+# Tick label of a class breakpoint.
+def format_break(value):
+    if np.isnan(value):
+        return "n/a"
+    return f'{value:,.0f}' if abs(value) >= 1000 else f'{value:.3g}'
+
+# Legend for a data-driven classing: the breakpoints label the class boundaries.
+def create_classed_legend_figure(x_var, user_var, classing, year, breaks):
+    spec = get_indicator(x_var, axis='x')
+    x_label = spec['title'] if spec is not None else "X Value"
+    _, _, secondary_label = get_secondary_range(user_var)
+    x_breaks, y_breaks = breaks
+    classes = len(x_breaks) + 1
+    boundaries = np.arange(1, classes) + 0.5
+    title = CLASSINGS[classing] + (f" ({year})" if year is not None else "")
+
+    with timed('dashboard_stage_seconds', callback='create_2d_legend_figure', stage='figure'):
+        fig = go.Figure(classed_legend_base_figure(classes))
+        fig.update_layout(title=f"Bivariate Classes: {title}")
+        fig.update_traces(hovertemplate=f'{x_label}: class %{{x}} of {classes}<br>{secondary_label}: class %{{y}} of {classes}<extra></extra>')
+        fig.update_xaxes(title_text=x_label, tickmode='array', tickvals=boundaries, ticktext=[format_break(v) for v in x_breaks])
+        fig.update_yaxes(title_text=secondary_label, tickmode='array', tickvals=boundaries, ticktext=[format_break(v) for v in y_breaks])
+    return fig
+
+# Create the 2D legend figure.
+# Now accepts x_var to update the x-axis label and ticks.
+# A data-driven classing labels the classes with the breakpoints of the year (per-year
+# classings) or of all years.
+def create_2d_legend_figure(x_var, user_var='', classing=DEFAULT_CLASSING, year=None):
+    if parse_classing(classing) is not None:
+        breaks = classing_breaks(get_data_cube(), x_var, user_var, classing, year)
+        if breaks is not None:
+            return create_classed_legend_figure(x_var, user_var, classing, year, breaks)
+
+    secondary_min, secondary_max, secondary_label = get_secondary_range(user_var)
     
-    # Load secondary data for the y-axis.
-    if secondary_var == 'health':
-        secondary_data = load_health_expenditure_data()
-        sec_col = "health_exp"
-        sec_label = "Health Expenditure"
-    elif secondary_var == 'lifeexp':
-        secondary_data = load_life_expectancy_data()
-        sec_col = "life_exp"
-        sec_label = "Life Expectancy"
-    elif secondary_var == 'epidemic':
-        secondary_data = load_epidemic_data()
-        sec_col = "epidemic"
-        sec_label = "Epidemic Cases"
-    elif secondary_var == 'econ':
-        secondary_data = load_economic_sentiment()
-        sec_col = "econ_sentiment"
-        sec_label = "Economic Sentiment"
-    elif secondary_var == 'employment':
-        secondary_data = load_employment_rate_data()
-        sec_col = "employment_rate"
-        sec_label = "Employment Rate"
-    elif secondary_var == 'tourism':
-        secondary_data = load_tourism_data()
-        sec_col = "tourism_rate"
-        sec_label = "Personal Tourism (%)"
-    elif secondary_var == 'tourism_nights':
-        secondary_data = load_tourism_nights_data()
-        sec_col = "tourism_nights"
-        sec_label = "Tourism Nights"
+    # Determine x-axis label and ticks based on x_var.
+    spec = get_indicator(x_var, axis='x')
+    if spec is not None:
+        x_label = spec['title']
+        x_min, x_max = spec['range']
+        x_ticks_actual = spec['ticks']
+        x_ticks_norm = [(val - x_min) / (x_max - x_min) for val in x_ticks_actual]
     else:
+        x_label = "X Value"
+        x_ticks_actual = [0, 0.25, 0.5, 0.75, 1]
+        x_ticks_norm = x_ticks_actual
+
+    # Only the labels and ticks depend on the chosen variables.
+    with timed('dashboard_stage_seconds', callback='create_2d_legend_figure', stage='figure'):
+        fig = go.Figure(legend_base_figure())
+        fig.update_traces(hovertemplate=f'{x_label}: %{{x}}<br>{secondary_label}: %{{y}}<br>color: [%{{z[0]}}, %{{z[1]}}, %{{z[2]}}]<extra></extra>')
+        fig.update_xaxes(title_text=x_label, tickmode='array', tickvals=x_ticks_norm, ticktext=[str(val) for val in x_ticks_actual])
+        
+        y_ticks_actual = np.linspace(secondary_min, secondary_max, 5)
+        y_ticks_norm = [(val - secondary_min) / (secondary_max - secondary_min) for val in y_ticks_actual]
+        fig.update_yaxes(title_text=secondary_label, tickmode='array', tickvals=y_ticks_norm, ticktext=[f'{val:.0f}' for val in y_ticks_actual])
+    return fig
+
+# Column names and labels for an (x, secondary) pair, None if either is unknown.
+def get_map_labels(x_var, secondary_var):
+    base = get_indicator(x_var, axis='x')
+    secondary = get_indicator(secondary_var, axis='y')
+    if base is None or secondary is None:
+        return None
+    return base['column'], base['title'], secondary['column'], secondary['title']
+
+# SINGLE_TRACE_MAP=1 draws the map as one choropleth trace over the bundled country
+# outlines (geometry.py) instead of one plotly express trace per color
+SINGLE_TRACE_MAP = os.environ.get('SINGLE_TRACE_MAP', '').lower() in ('1', 'true')
+
+# One trace for every country: z is the country's position and the colorscale has a flat
+# step per position, so each country gets exactly its own color (like assets/map_frames.js).
+# The outlines are fetched once by the browser from the geojson url, the figure only
+# carries the locations, colors and hover values.
+def single_trace_map(locations, names, colors, customdata, hovertemplate, title):
+    n = len(locations)
+    colorscale = []
+    for i, color in enumerate(colors):
+        colorscale += [[round(i / n, 6), color], [round((i + 1) / n, 6), color]]
+    if n == 0:
+        # no country has data (e.g. a dataset failed to load): an empty map, plotly
+        # doesn't take an empty colorscale
+        colorscale = [[0, 'lightgrey'], [1, 'lightgrey']]
+    fig = go.Figure(go.Choropleth(
+        geojson=geojson_url(),
+        featureidkey='id',
+        locations=locations,
+        z=np.arange(n) + 0.5,
+        zmin=0,
+        zmax=max(n, 1),
+        colorscale=colorscale,
+        showscale=False,
+        hovertext=names,
+        customdata=customdata,
+        hovertemplate=hovertemplate
+    ))
+    fig.update_layout(title=title, geo=dict(scope='europe'), showlegend=False, margin=dict(t=60), template='none')
+    return fig
+
+# Create the bivariate map figure.
+def create_bivariate_map(x_var, secondary_var, year, classing=DEFAULT_CLASSING):
+    labels = get_map_labels(x_var, secondary_var)
+    if labels is None:
         return px.choropleth(title="No data available.")
+    base_col, base_label, sec_col, sec_label = labels
     
-    # Filter by year and merge.
-    baseline_year = baseline_data[baseline_data['year'] == year].copy()
-    baseline_year = baseline_year.rename(columns={"Country": "Country_baseline"})
-    secondary_year = secondary_data[secondary_data['year'] == year].copy()
-    secondary_year = secondary_year.rename(columns={"Country": "Country_secondary"})
-    df_merged = baseline_year.merge(secondary_year, on=['iso_alpha', 'year'], how='inner')
+    # Slice both indicators for the year out of the cube; countries need both values.
+    with timed('dashboard_stage_seconds', callback='create_bivariate_map', stage='data'):
+        cube = get_data_cube()
+        x_values = cube_slice(cube, x_var, year)
+        sec_values = cube_slice(cube, secondary_var, year)
+        has_base = ~np.isnan(x_values)
+        mask = has_base & ~np.isnan(sec_values)
+        breaks = classing_breaks(cube, x_var, secondary_var, classing, year)
     
-    if df_merged.empty:
-        df_base = baseline_year.copy()
+    title = f"Bivariate Map: {base_label} vs. {sec_label} ({year})"
+    if SINGLE_TRACE_MAP:
+        shown = mask if mask.any() else has_base
+        if mask.any():
+            with timed('dashboard_stage_seconds', callback='create_bivariate_map', stage='color'):
+                colors = compute_colors(x_values[mask], sec_values[mask], x_var=x_var, secondary=secondary_var, breaks=breaks)
+            sec_text = '%{customdata[1]}'
+        else:
+            colors = ['lightgrey'] * int(has_base.sum())
+            sec_text = 'N/A'
+        with timed('dashboard_stage_seconds', callback='create_bivariate_map', stage='figure'):
+            return single_trace_map(
+                cube.isos[shown], cube.names[shown], colors,
+                np.column_stack([x_values[shown], sec_values[shown]]),
+                f'<b>%{{hovertext}}</b><br>{base_label}: %{{customdata[0]}}<br>{sec_label}: {sec_text}<extra></extra>',
+                title
+            )
+
+    if not mask.any():
+        df_base = pd.DataFrame({
+            'iso_alpha': cube.isos[has_base],
+            'Country': cube.names[has_base],
+            base_col: x_values[has_base],
+            sec_col: None
+        })
         df_base["color"] = "lightgrey"
-        df_base[base_col] = df_base[base_col].apply(safe_float)
-        df_base[sec_col] = None
-        df_base["Country"] = df_base["Country_baseline"]
+        with timed('dashboard_stage_seconds', callback='create_bivariate_map', stage='figure'):
+            fig = px.choropleth(
+                df_base,
+                locations='iso_alpha',
+                color='color',
+                hover_name='Country',
+                custom_data=[base_col, sec_col],
+                color_discrete_map={"lightgrey": "lightgrey"},
+                scope='europe',
+                title=title
+            )
+            fig.update_traces(hovertemplate=f'<b>%{{hovertext}}</b><br>{base_label}: %{{customdata[0]}}<br>{sec_label}: N/A<extra></extra>')
+            fig.update_layout(showlegend=False)
+        return fig
+
+    df_merged = pd.DataFrame({
+        'iso_alpha': cube.isos[mask],
+        'Country': cube.names[mask],
+        base_col: x_values[mask],
+        sec_col: sec_values[mask]
+    })
+    
+    # Compute the colors for all countries at once.
+    with timed('dashboard_stage_seconds', callback='create_bivariate_map', stage='color'):
+        df_merged["color"] = compute_colors(x_values[mask], sec_values[mask], x_var=x_var, secondary=secondary_var, breaks=breaks)
+
+    with timed('dashboard_stage_seconds', callback='create_bivariate_map', stage='figure'):
         fig = px.choropleth(
-            df_base,
+            df_merged,
             locations='iso_alpha',
             color='color',
             hover_name='Country',
             custom_data=[base_col, sec_col],
-            color_discrete_map={"lightgrey": "lightgrey"},
+            color_discrete_map={c: c for c in df_merged["color"].unique()},
             scope='europe',
-            title=f"Bivariate Map: {base_label} vs. {sec_label} ({year})"
+            title=title
         )
-        fig.update_traces(hovertemplate=f'<b>%{{hovertext}}</b><br>{base_label}: %{{customdata[0]}}<br>{sec_label}: N/A<extra></extra>')
+        fig.update_traces(hovertemplate=f'<b>%{{hovertext}}</b><br>{base_label}: %{{customdata[0]}}<br>{sec_label}: %{{customdata[1]}}<extra></extra>')
         fig.update_layout(showlegend=False)
-        return fig
-
-    # Process merged data.
-    df_merged["Country"] = df_merged["Country_baseline"]
-    df_merged[base_col] = df_merged[base_col].apply(safe_float)
-    df_merged[sec_col] = df_merged[sec_col].apply(safe_float)
-    
-    # Compute the color for each row.
-    df_merged["color"] = df_merged.apply(
-        lambda row: compute_final_color(row[base_col], row[sec_col], x_var=x_var, secondary=secondary_var),
-        axis=1
-    )
-    
-    fig = px.choropleth(
-        df_merged,
-        locations='iso_alpha',
-        color='color',
-        hover_name='Country',
-        custom_data=[base_col, sec_col],
-        color_discrete_map={c: c for c in df_merged["color"].unique()},
-        scope='europe',
-        title=f"Bivariate Map: {base_label} vs. {sec_label} ({year})"
-    )
-    fig.update_traces(hovertemplate=f'<b>%{{hovertext}}</b><br>{base_label}: %{{customdata[0]}}<br>{sec_label}: %{{customdata[1]}}<extra></extra>')
-    fig.update_layout(showlegend=False)
     return fig
+
+# Compact payload with the colors and hover values of every year for one (x, secondary)
+# pair, so the browser can switch years itself (see assets/map_frames.js).
+def create_bivariate_frames(x_var, secondary_var, years, classing=DEFAULT_CLASSING):
+    labels = get_map_labels(x_var, secondary_var)
+    if labels is None:
+        return {'title': "No data available.", 'locations': [], 'names': [], 'frames': {}}
+    _, base_label, _, sec_label = labels
+
+    cube = get_data_cube()
+    frames = {}
+    for year in years:
+        x_values = cube_slice(cube, x_var, year)
+        sec_values = cube_slice(cube, secondary_var, year)
+        has_base = ~np.isnan(x_values)
+        mask = has_base & ~np.isnan(sec_values)
+        if mask.any():
+            breaks = classing_breaks(cube, x_var, secondary_var, classing, year)
+            frames[str(year)] = {
+                'idx': np.flatnonzero(mask).tolist(),
+                'colors': compute_colors(x_values[mask], sec_values[mask], x_var=x_var, secondary=secondary_var, breaks=breaks).tolist(),
+                'x': x_values[mask].tolist(),
+                'y': sec_values[mask].tolist()
+            }
+        else:
+            # no overlap this year: grey out the baseline countries like create_bivariate_map
+            frames[str(year)] = {
+                'idx': np.flatnonzero(has_base).tolist(),
+                'colors': ['lightgrey'] * int(has_base.sum()),
+                'x': x_values[has_base].tolist(),
+                'y': None
+            }
+
+    return {
+        'title': f"Bivariate Map: {base_label} vs. {sec_label}",
+        'geojson': geojson_url() if SINGLE_TRACE_MAP else None,
+        'x_label': base_label,
+        'y_label': sec_label,
+        'locations': cube.isos.tolist(),
+        'names': cube.names.tolist(),
+        'frames': frames
+    }
+
+# JSON-cached versions for the app callbacks, keyed by their arguments and the data
+# versions of the two indicators they show (the legend only reads data for the
+# breakpoints of a data-driven classing).
+def map_indicators(x_var, secondary_var, *_):
+    return (x_var, secondary_var)
+
+def legend_indicators(x_var, user_var='', classing=DEFAULT_CLASSING, *_):
+    return (x_var, user_var) if parse_classing(classing) is not None else ()
+
+# One LRU per kind of figure, each big enough for every combination the dashboard can
+# ask for (2 x 7 pairs: 700 maps, 70 frame sets, 322 legends), so browsing the classings
+# never evicts the maps the warm-up seeded.
+PAIRS = len(indicator_options('x')) * len(indicator_options('y'))
+PER_YEAR_CLASSINGS = sum(per_year(classing) for classing in CLASSINGS)
+map_cache = FigureCache(figure_cache_size(PAIRS * len(CLASSINGS) * len(YEARS)))
+frames_cache = FigureCache(figure_cache_size(PAIRS * len(CLASSINGS)))
+legend_cache = FigureCache(figure_cache_size(
+    PAIRS * (len(CLASSINGS) - PER_YEAR_CLASSINGS + PER_YEAR_CLASSINGS * len(YEARS))))
+
+cached_bivariate_map = memoize_figure(create_bivariate_map, depends=map_indicators, store=map_cache)
+cached_2d_legend_figure = memoize_figure(create_2d_legend_figure, depends=legend_indicators, store=legend_cache)
+cached_bivariate_frames = memoize_figure(create_bivariate_frames, depends=map_indicators, store=frames_cache)
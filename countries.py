@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+# Country name normalization. Every spelling the csvs use for a country maps to its
+# iso code here; both lookup tables are built once at import.
+
+# map the country iso codes (Eurostat variants like EL, Czechia and UK included);
+# the first spelling of each code is its display name
+CSV_COUNTRY_ISO = {
+    'Albania': 'ALB',
+    'Armenia': 'ARM',
+    'Austria': 'AUT',
+    'Belgium': 'BEL',
+    'Bulgaria': 'BGR',
+    'Croatia': 'HRV',
+    'Cyprus': 'CYP',
+    'Czechia': 'CZE',
+    'Czech Republic': 'CZE',
+    'Denmark': 'DNK',
+    'Estonia': 'EST',
+    'Finland': 'FIN',
+    'France': 'FRA',
+    'Germany': 'DEU',
+    'Greece': 'GRC',
+    'EL': 'GRC',
+    'Hungary': 'HUN',
+    'Ireland': 'IRL',
+    'Italy': 'ITA',
+    'Latvia': 'LVA',
+    'Lithuania': 'LTU',
+    'Luxembourg': 'LUX',
+    'Malta': 'MLT',
+    'Netherlands': 'NLD',
+    'Poland': 'POL',
+    'Portugal': 'PRT',
+    'Romania': 'ROU',
+    'Slovakia': 'SVK',
+    'Slovenia': 'SVN',
+    'Spain': 'ESP',
+    'Sweden': 'SWE',
+    'United Kingdom': 'GBR',
+    'UK': 'GBR'
+}
+
+# iso code -> display name, the first spelling listed above wins (so GRC is Greece, not EL)
+ISO_COUNTRY_NAME = {}
+for _name, _iso in CSV_COUNTRY_ISO.items():
+    ISO_COUNTRY_NAME.setdefault(_iso, _name)
+
+# one categorical dtype for the iso column of every dataset, so frames share the codes
+ISO_DTYPE = pd.CategoricalDtype(sorted(ISO_COUNTRY_NAME))
+
+
+def iso_to_name(iso):
+    return ISO_COUNTRY_NAME.get(iso, iso)
+
+
+def strip_parenthesized(names):
+    # "Reunion (France)" -> "France", anything else is just stripped
+    inner = names.str.extract(r'\(([^)]*)\)', expand=False)
+    return inner.fillna(names).str.strip()
+
+
+def _lookup_codes(codes, labels, table):
+    # translate each distinct label once, then fan the result out through the codes;
+    # code -1 (missing) picks the trailing None
+    lookup = np.array([table.get(label) for label in labels] + [None], dtype=object)
+    return lookup[codes]
+
+
+def map_to_iso(names):
+    # iso code for every entry of a Series of country names, None where unknown.
+    # Each distinct name is looked up once (categorical codes or a factorize pass).
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        codes, labels = names.cat.codes.to_numpy(), names.cat.categories
+    else:
+        codes, labels = pd.factorize(names)
+    return pd.Series(_lookup_codes(codes, labels, CSV_COUNTRY_ISO), index=names.index, dtype=object)
+
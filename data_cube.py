@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from cache import cache
+from classing import compute_breaks
+from countries import iso_to_name
+from data_loaders import load_all
+from indicators import INDICATORS
+from versions import indicator_versions
+
+# values[indicator, country, year] holds the (mean) value, NaN where there is no data
+DataCube = namedtuple('DataCube', [
+    'indicators',       # list of indicator keys, axis 0
+    'isos',             # array of iso codes, axis 1
+    'names',            # array of display names, parallel to isos
+    'years',            # array of int years, axis 2
+    'values',           # float64 array (indicator, country, year)
+    'indicator_index',  # indicator key -> axis 0 position
+    'year_index',       # year -> axis 2 position
+    'breaks'            # (method, period) -> class breakpoints, see classing.compute_breaks
+], defaults=(None,))  # cubes cached by an older release (filesystem/redis) have no breaks
+
+
+def widen(values):
+    # float32 -> float64 through the shortest repr, so 2.1f stays 2.1 instead of 2.0999999046325684
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return values.astype(str).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def build_data_cube(versions=None):
+    # a dataset that fails to load simply stays all-NaN in the cube;
+    # versions pins the data version of some or all indicators
+    loaded, _, _ = load_all(versions=versions)
+    frames = {}
+    for key, df in loaded.items():
+        col = INDICATORS[key]['column']
+        df = df[df['iso_alpha'].notnull()]
+        frames[key] = pd.DataFrame({
+            'iso_alpha': df['iso_alpha'].astype(str).to_numpy(),
+            'year': df['year'].to_numpy(dtype=int),
+            'value': widen(pd.to_numeric(df[col], errors='coerce'))
+        })
+
+    isos = np.array(sorted(set().union(*(df['iso_alpha'] for df in frames.values()))))
+    years = np.array(sorted(set().union(*(df['year'] for df in frames.values()))), dtype=int)
+    indicators = list(INDICATORS)
+
+    values = np.full((len(indicators), len(isos), len(years)), np.nan)
+    for i, key in enumerate(indicators):
+        if key not in frames:
+            continue
+        grouped = frames[key].groupby(['iso_alpha', 'year'], as_index=False)['value'].mean()
+        rows = np.searchsorted(isos, grouped['iso_alpha'].to_numpy())
+        cols = np.searchsorted(years, grouped['year'].to_numpy())
+        values[i, rows, cols] = grouped['value'].to_numpy()
+
+    return DataCube(
+        indicators=indicators,
+        isos=isos,
+        names=np.array([iso_to_name(iso) for iso in isos]),
+        years=years,
+        values=values,
+        indicator_index={key: i for i, key in enumerate(indicators)},
+        year_index={int(y): j for j, y in enumerate(years)},
+        breaks=compute_breaks(values)
+    )
+
+
+def get_data_cube():
+    # cube for the current data versions of every indicator
+    return _get_data_cube(tuple(indicator_versions(INDICATORS).items()))
+
+
+@cache.memoize(timeout=3600)
+def _get_data_cube(versions):
+    return build_data_cube(dict(versions))
+
+
+def cube_slice(cube, indicator, year):
+    # values of one indicator for every country in one year (all NaN if the year isn't covered)
+    j = cube.year_index.get(year)
+    if j is None:
+        return np.full(len(cube.isos), np.nan)
+    return cube.values[cube.indicator_index[indicator], :, j]
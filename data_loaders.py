@@ -1,210 +1,158 @@
+import logging
 import os
-import pandas as pd
-from cache import cache
-
-# base directory for data files
-BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-
-# map the country iso codes
-CSV_COUNTRY_ISO = {
-    'Albania': 'ALB',
-    'Armenia': 'ARM',
-    'Austria': 'AUT',
-    'Belgium': 'BEL',
-    'Bulgaria': 'BGR',
-    'Croatia': 'HRV',
-    'Cyprus': 'CYP',
-    'Czech Republic': 'CZE',
-    'Czechia': 'CZE',
-    'Denmark': 'DNK',
-    'Estonia': 'EST',
-    'Finland': 'FIN',
-    'France': 'FRA',
-    'Germany': 'DEU',
-    'Greece': 'GRC',
-    'EL': 'GRC',
-    'Hungary': 'HUN',
-    'Ireland': 'IRL',
-    'Italy': 'ITA',
-    'Latvia': 'LVA',
-    'Lithuania': 'LTU',
-    'Luxembourg': 'LUX',
-    'Malta': 'MLT',
-    'Netherlands': 'NLD',
-    'Poland': 'POL',
-    'Portugal': 'PRT',
-    'Romania': 'ROU',
-    'Slovakia': 'SVK',
-    'Slovenia': 'SVN',
-    'Spain': 'ESP',
-    'Sweden': 'SWE',
-    'UK': 'GBR',
-    'United Kingdom': 'GBR'
-}
-
-def country_name_to_iso(country):
-    return CSV_COUNTRY_ISO.get(country)
-
-def iso_to_country_name(iso):
-    reverse_map = {x: y for y, x in CSV_COUNTRY_ISO.items()}
-    return reverse_map.get(iso, iso)
-
-def safe_float(x): # returns 0.0 if input isn't numeric 
-    try:
-        val = float(x)
-        return 0.0 if pd.isna(val) else val
-    except Exception:
-        return 0.0
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Load GDP Growth data
-@cache.memoize(timeout=3600) #save data for 1 hour
-def load_gdp_data():
-    path = os.path.join(BASE_DIR, 'GDPGrowthData.csv') # make the file path
-    df = pd.read_csv(path) # read the csv data
-
-    # convert the columns to numeric values
+import pandas as pd
+from cache import FrameSerializer, cache
+from countries import ISO_DTYPE, map_to_iso, strip_parenthesized
+from flask import current_app, has_app_context
+from indicators import INDICATORS
+from metrics import timed
+from snapshots import load_snapshot
+from versions import indicator_build, indicator_version, indicator_versions
+
+logger = logging.getLogger(__name__)
+
+# rows per chunk when streaming a csv; memory stays flat however large the extract is
+CHUNK_SIZE = int(os.environ.get('CSV_CHUNK_SIZE', 100000))
+
+# Stream a csv in chunks and aggregate it per (iso_alpha, year) as it goes, so peak
+# memory depends on countries x years rather than on the size of the file.
+# prepare(chunk) returns a frame with 'geo', 'year' and 'value' columns.
+# agg is 'mean' or 'sum' (missing values are skipped, like pandas' groupby).
+# The result uses the compact schema: iso_alpha as the shared ISO_DTYPE categorical,
+# int16 year and value_dtype values; display names come from countries.iso_to_name.
+def stream_aggregate(path, prepare, value_name, agg='mean', usecols=None, dtype=None, value_dtype='float32'):
+    totals = None
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=CHUNK_SIZE):
+        part = prepare(chunk)
+        part = pd.DataFrame({
+            'iso_alpha': map_to_iso(part['geo']),
+            'year': part['year'],
+            'value': pd.to_numeric(part['value'], errors='coerce')
+        })
+        part = part[part['iso_alpha'].notnull() & part['year'].notnull()]
+        grouped = part.groupby(['iso_alpha', 'year'])['value'].agg(['sum', 'count'])
+        totals = grouped if totals is None else totals.add(grouped, fill_value=0)
+
+    if totals is None or totals.empty:
+        totals = pd.DataFrame({'sum': [], 'count': []}, index=pd.MultiIndex.from_arrays([[], []], names=['iso_alpha', 'year']))
+    df = totals.reset_index()
+    if agg == 'sum':
+        values = df['sum']
+    else:
+        values = df['sum'] / df['count']  # 0 / 0 -> NaN when every value was missing
+    return pd.DataFrame({
+        'iso_alpha': pd.Categorical(df['iso_alpha'], dtype=ISO_DTYPE),
+        'year': df['year'].astype('int16'),
+        value_name: values.astype(value_dtype)
+    })
+
+# year parsers for the registry's 'period' setting
+def parse_period(periods, spec):
+    if spec['period'] == 'month':
+        # monthly periods look like 2024-03, keep the year
+        return pd.to_numeric(periods.str[:4], errors='coerce')
+    if spec['period'] == 'date':
+        return pd.to_datetime(periods, format=spec['date_format'], errors='coerce').dt.year
     # if conversion fails, errors='coerce' will set those entries to NaN.
-    df['year'] = pd.to_numeric(df['TIME_PERIOD'], errors='coerce')
-    df['OBS_VALUE'] = pd.to_numeric(df['OBS_VALUE'], errors='coerce')
-    
-    # create new column 'iso_alpha' by mapping the 'geo' column values to their ISO codes
-    df['iso_alpha'] = df['geo'].apply(country_name_to_iso)
-
-    # duplicate the 'geo' column into a new column called 'Country'
-    df['Country'] = df['geo']
-    
-    df = df[['Country', 'year', 'OBS_VALUE', 'iso_alpha']] # only keep important columns in data frame
-    df = df.rename(columns={'OBS_VALUE': 'gdp_value'}) # rename to increase readability
-
-    return df
+    return pd.to_numeric(periods, errors='coerce')
+
+# Turn one raw csv chunk into 'geo', 'year', 'value' columns as described by the registry entry
+def prepare_chunk(chunk, spec):
+    columns = spec['columns']
+    if spec.get('layout') == 'wide':
+        # one column per year
+        chunk = chunk.melt(id_vars=[columns['geo']], var_name='period', value_name='value')
+        columns = {'geo': columns['geo'], 'period': 'period', 'value': 'value'}
+    geo = chunk[columns['geo']]
+    if spec.get('clean_country'):
+        geo = strip_parenthesized(geo.astype(str))
+    part = pd.DataFrame({
+        'geo': geo,
+        'year': parse_period(chunk[columns['period']].astype(str), spec),
+        'value': chunk[columns['value']]
+    })
+    if 'countries' in spec:
+        part = part[part['geo'].isin(spec['countries'])]
+    return part
+
+def read_indicator(key, path):
+    spec = INDICATORS[key]
+    columns = spec['columns']
+    usecols = dtype = None
+    if spec.get('layout') != 'wide':
+        # only read the three columns we need, all as text (no type inference);
+        # country names as categories so each distinct name is mapped once
+        usecols = [columns['geo'], columns['period'], columns['value']]
+        dtype = {columns['period']: str, columns['value']: str}
+        dtype[columns['geo']] = str if spec.get('clean_country') else 'category'
+    with timed('dashboard_loader_parse_seconds', indicator=key):
+        return stream_aggregate(
+            path, lambda chunk: prepare_chunk(chunk, spec), spec['column'],
+            agg=spec['agg'], usecols=usecols, dtype=dtype, value_dtype=spec.get('dtype', 'float32')
+        )
+
+# Load one indicator from the registry: (iso_alpha, year, <column>) per row.
+# version defaults to the indicator's current data version (see versions.py).
+# The snapshot saves the csv parsing; cache.memoize still keeps its own serialized copy of
+# the frame, because that entry is what pins a data version while a reload is pending.
+def load_indicator(key, version=None):
+    return _load_indicator(key, version or indicator_version(key))
 
-# Load GDP Per Capita data
-@cache.memoize(timeout=3600)
-def load_gdp_per_capita_data():
-    path = os.path.join(BASE_DIR, 'GDPPerCapitaData.csv')
-    df = pd.read_csv(path)
-    df['year'] = pd.to_numeric(df['TIME_PERIOD'], errors='coerce')
-    df['OBS_VALUE'] = pd.to_numeric(df['OBS_VALUE'], errors='coerce')
-    df['iso_alpha'] = df['geo'].apply(country_name_to_iso)
-    df['Country'] = df['geo']
-    df = df[['Country', 'year', 'OBS_VALUE', 'iso_alpha']]
-    df = df.rename(columns={'OBS_VALUE': 'gdp_per_capita'})
-    return df
-
-# Load Health Expenditure data
-@cache.memoize(timeout=3600)
-def load_health_expenditure_data():
-    path = os.path.join(BASE_DIR, 'HealthcareExpenditureData.csv')
-    df = pd.read_csv(path)
-    df['year'] = pd.to_numeric(df['TIME_PERIOD'], errors='coerce')
-    df['OBS_VALUE'] = pd.to_numeric(df['OBS_VALUE'], errors='coerce')
-    df['iso_alpha'] = df['geo'].apply(country_name_to_iso)
-    df = df[df['iso_alpha'].notnull()].copy()
-    df = df.rename(columns={'OBS_VALUE': 'health_exp'})
-    df_grouped = df.groupby(['iso_alpha', 'year'], as_index=False)['health_exp'].mean()
-    df_grouped["Country"] = df_grouped["iso_alpha"].apply(iso_to_country_name)
-    return df_grouped
-
-# Load Life Expectancy data
-@cache.memoize(timeout=3600)
-def load_life_expectancy_data():
-    path = os.path.join(BASE_DIR, 'LifeExpectancyData(1YO).csv')
-    df = pd.read_csv(path)
-    df['year'] = pd.to_numeric(df['TIME_PERIOD'], errors='coerce')
-    df['OBS_VALUE'] = pd.to_numeric(df['OBS_VALUE'], errors='coerce')
-    df['iso_alpha'] = df['geo'].apply(country_name_to_iso)
-    df = df[df['iso_alpha'].notnull()].copy()
-    df = df.rename(columns={'OBS_VALUE': 'life_exp'})
-    df_grouped = df.groupby(['iso_alpha', 'year'], as_index=False)['life_exp'].mean()
-    df_grouped["Country"] = df_grouped["iso_alpha"].apply(iso_to_country_name)
-    return df_grouped
-
-# Load Economic Sentiment data
-@cache.memoize(timeout=3600)
-def load_economic_sentiment():
-    path = os.path.join(BASE_DIR, 'EconomicSentimentData.csv')
-    df = pd.read_csv(path)
-    df['year'] = df['TIME_PERIOD'].astype(str).str[:4].astype(int)
-    df['OBS_VALUE'] = pd.to_numeric(df['OBS_VALUE'], errors='coerce')
-    df['iso_alpha'] = df['geo'].apply(country_name_to_iso)
-    df = df[df['iso_alpha'].notnull()].copy()
-    df = df.rename(columns={'OBS_VALUE': 'econ_sentiment'})
-    df_grouped = df.groupby(['iso_alpha', 'year'], as_index=False)['econ_sentiment'].mean()
-    df_grouped["Country"] = df_grouped["iso_alpha"].apply(iso_to_country_name)
-    return df_grouped
-
-# Load Epidemic data
-@cache.memoize(timeout=3600)
-def load_epidemic_data():
-    path = os.path.join(BASE_DIR, 'EpidemicData.csv')
-    df_demo = pd.read_csv(path)
-
-    def clean_country(country):
-        if pd.isna(country):
-            return country
-        if "(" in country and ")" in country:
-            start = country.find("(")
-            end = country.find(")")
-            return country[start+1:end].strip()
-        return country.strip()
-
-    df_demo['clean_country'] = df_demo['country_extracted'].apply(clean_country)
-    european_countries = [
-        'Austria', 'Belgium', 'Bulgaria', 'Croatia', 'Cyprus', 'Czech Republic',
-        'Denmark', 'Estonia', 'Finland', 'France', 'Germany', 'Greece', 'Hungary',
-        'Ireland', 'Italy', 'Latvia', 'Lithuania', 'Luxembourg', 'Malta',
-        'Netherlands', 'Poland', 'Portugal', 'Romania', 'Slovakia', 'Slovenia',
-        'Spain', 'Sweden', 'United Kingdom', 'Norway', 'Switzerland'
-    ]
-    df_europe = df_demo[df_demo['clean_country'].isin(european_countries)].copy()
-    df_europe['cases_extracted'] = pd.to_numeric(df_europe['cases_extracted'], errors='coerce')
-    df_europe['date_extracted'] = pd.to_datetime(df_europe['date_extracted'], errors='coerce')
-    df_europe['year'] = df_europe['date_extracted'].dt.year
-
-    df_grouped = df_europe.groupby(['clean_country', 'year'], as_index=False)['cases_extracted'].sum()
-    df_grouped['iso_alpha'] = df_grouped['clean_country'].apply(country_name_to_iso)
-    df_grouped = df_grouped[df_grouped['iso_alpha'].notnull()].copy()
-    df_grouped = df_grouped.rename(columns={'cases_extracted': 'epidemic'})
-    return df_grouped[['iso_alpha', 'year', 'epidemic']]
-
-# Load Employment Rate data
-@cache.memoize(timeout=3600)
-def load_employment_rate_data():
-    path = os.path.join(BASE_DIR, 'EmploymentRateData.csv')
-    df = pd.read_csv(path)
-    df['year'] = pd.to_numeric(df['TIME_PERIOD'], errors='coerce')
-    df['OBS_VALUE'] = pd.to_numeric(df['OBS_VALUE'], errors='coerce')
-    df['iso_alpha'] = df['geo'].apply(country_name_to_iso)
-    df['Country'] = df['geo']
-    df = df[['Country', 'year', 'OBS_VALUE', 'iso_alpha']]
-    df = df.rename(columns={'OBS_VALUE': 'employment_rate'})
-    df_grouped = df.groupby(['iso_alpha', 'year'], as_index=False)['employment_rate'].mean()
-    df_grouped["Country"] = df_grouped["iso_alpha"].apply(iso_to_country_name)
-    return df_grouped
-
-# Load Tourism data
-@cache.memoize(timeout=3600)
-def load_tourism_data():
-    path = os.path.join(BASE_DIR, 'PercentTourismContributing.csv')
-    df = pd.read_csv(path)
-    df_long = df.melt(id_vars=['Country'], var_name='year', value_name='tourism_rate')
-    df_long['year'] = pd.to_numeric(df_long['year'], errors='coerce')
-    df_long['tourism_rate'] = pd.to_numeric(df_long['tourism_rate'], errors='coerce')
-    df_long['iso_alpha'] = df_long['Country'].apply(country_name_to_iso)
-    df_long = df_long[df_long['iso_alpha'].notnull()].copy()
-    return df_long[['iso_alpha', 'year', 'tourism_rate', 'Country']]
-
-# Load Tourism Nights data
-@cache.memoize(timeout=3600)
-def load_tourism_nights_data():
-    path = os.path.join(BASE_DIR, 'TourismNights.csv')
-    df = pd.read_csv(path)
-    df['year'] = pd.to_numeric(df['YEAR'], errors='coerce')
-    df['OBS_VALUE'] = pd.to_numeric(df['VALUE'], errors='coerce')
-    df['iso_alpha'] = df['NAME'].apply(country_name_to_iso)
-    df['Country'] = df['NAME']
-    df = df[['Country', 'year', 'OBS_VALUE', 'iso_alpha']]
-    df = df.rename(columns={'OBS_VALUE': 'tourism_nights'})
-    df_grouped = df.groupby(['iso_alpha', 'year'], as_index=False)['tourism_nights'].mean()
-    df_grouped["Country"] = df_grouped["iso_alpha"].apply(iso_to_country_name)
-    return df_grouped
+@cache.memoize(timeout=3600) #save data for 1 hour
+def _load_indicator(key, version):
+    spec = INDICATORS[key]
+    # the snapshot is rebuilt whenever the registry entry changes
+    with timed('dashboard_loader_seconds', indicator=key):
+        return load_snapshot(spec['source'], lambda path: read_indicator(key, path), build=indicator_build(key))
+
+# Load every registered indicator at once on a thread pool, so a cold start costs about
+# as much as the slowest file. Results go through cache.memoize as usual.
+# Returns (frames, timings, errors) keyed by indicator; a loader that raises is
+# logged and reported in errors instead of stopping the others.
+# versions pins the data version per indicator (looked up here, not in the threads).
+def load_all(keys=None, max_workers=None, versions=None):
+    keys = list(INDICATORS) if keys is None else list(keys)
+    versions = {**indicator_versions(keys), **(versions or {})}
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run(key):
+        start = time.perf_counter()
+        try:
+            if app is not None:
+                with app.app_context():  # threads don't inherit the app context
+                    frame = load_indicator(key, versions[key])
+            else:
+                frame = load_indicator(key, versions[key])
+            return key, frame, time.perf_counter() - start, None
+        except Exception as e:
+            return key, None, time.perf_counter() - start, e
+
+    frames, timings, errors = {}, {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(keys) or 1) as pool:
+        for key, frame, seconds, error in pool.map(run, keys):
+            timings[key] = seconds
+            if error is None:
+                frames[key] = frame
+            else:
+                errors[key] = error
+                logger.error("loading %s failed after %.3fs: %r", key, seconds, error)
+    return frames, timings, errors
+
+# Memory held by each loaded dataset: rows, in-memory bytes (also per column) and the
+# size of its cache entry once serialized. Loads the datasets through load_all.
+def memory_report(keys=None):
+    frames, _, _ = load_all(keys)
+    serializer = FrameSerializer()
+    report = {}
+    for key, df in frames.items():
+        usage = df.memory_usage(deep=True, index=False)
+        report[key] = {
+            'rows': len(df),
+            'bytes': int(usage.sum()),
+            'cache_bytes': len(serializer.dumps(df)),
+            'columns': {name: {'dtype': str(df[name].dtype), 'bytes': int(usage[name])} for name in df.columns}
+        }
+    return report
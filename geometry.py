@@ -0,0 +1,149 @@
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+from flask import Response, request
+
+# Country outlines for the single-trace map (SINGLE_TRACE_MAP=1).
+#
+# data/geo/europe.geojson holds the countries of the iso table only, cut to the map's
+# extent (no overseas territories), with 3 decimals: Natural Earth's 1:110m admin-0
+# countries (public domain), plus Malta from world.geo.json since 1:110m doesn't have it.
+# Feature ids are the iso codes.
+#
+# The file is served once from GEOJSON_ROUTE and cached by the browser; the figures only
+# carry its url. GEO_SIMPLIFY (degrees, 0 = as bundled) simplifies the outlines further and
+# GEO_PRECISION rounds the coordinates, both when the app starts.
+
+GEOJSON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "geo", "europe.geojson")
+GEOJSON_ROUTE = '/geo/europe.geojson'
+GEO_SIMPLIFY = float(os.environ.get('GEO_SIMPLIFY', 0))
+GEO_PRECISION = int(os.environ.get('GEO_PRECISION', 3))
+
+
+def douglas_peucker(points, tolerance):
+    # keep mask for an (n, 2) array of points, the first and last are always kept
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        dx, dy = b - a
+        length = np.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(dx * (inner[:, 1] - a[1]) - dy * (inner[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.extend([(start, mid), (mid, end)])
+    return keep
+
+
+def _rings(geometry):
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    return [ring for polygon in polygons for ring in polygon]
+
+
+def simplify_features(features, tolerance):
+    # Simplify every ring without opening gaps between neighbours: a border shared by two
+    # countries is cut at the points where it starts and ends and each piece is simplified
+    # once, so both countries get exactly the same line.
+    owners = {}
+    for feature in features:
+        for ring in _rings(feature['geometry']):
+            for point in ring:
+                owners.setdefault(tuple(point), set()).add(feature['id'])
+
+    pieces = {}
+
+    def simplify_piece(piece):
+        # same result whichever way round the piece is walked
+        forward = tuple(map(tuple, piece))
+        canonical = min(forward, forward[::-1])
+        if canonical not in pieces:
+            arr = np.array(canonical)
+            pieces[canonical] = [list(p) for p in arr[douglas_peucker(arr, tolerance)]]
+        kept = pieces[canonical]
+        return kept if canonical == forward else kept[::-1]
+
+    def simplify_ring(ring):
+        n = len(ring) - 1  # the last point repeats the first
+        sets = [owners[tuple(p)] for p in ring[:n]]
+        fixed = [i for i in range(n) if sets[i] != sets[i - 1] or sets[i] != sets[(i + 1) % n]]
+        if not fixed:
+            fixed = [0]
+        out = []
+        for j, start in enumerate(fixed):
+            end = fixed[(j + 1) % len(fixed)]
+            piece = ring[start:end + 1] if end > start else ring[start:n] + ring[:end + 1]
+            out.extend(simplify_piece(piece)[:-1])
+        out.append(out[0])
+        return out if len(out) >= 4 else None  # collapsed to a line
+
+    result = []
+    for feature in features:
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        simplified = []
+        for polygon in polygons:
+            rings = [simplify_ring(ring) for ring in polygon]
+            if rings[0] is not None:
+                simplified.append([ring for ring in rings if ring is not None])
+        if not simplified:
+            simplified = polygons  # never lose a whole country, keep it as it was
+        if len(simplified) == 1:
+            geometry = {'type': 'Polygon', 'coordinates': simplified[0]}
+        else:
+            geometry = {'type': 'MultiPolygon', 'coordinates': simplified}
+        result.append({**feature, 'geometry': geometry})
+    return result
+
+
+def _round(coords, precision):
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, precision) for c in coords]
+    return [_round(c, precision) for c in coords]
+
+
+@functools.lru_cache(maxsize=4)
+def europe_geojson(tolerance=GEO_SIMPLIFY, precision=GEO_PRECISION):
+    # (compact json bytes, etag) of the bundled outlines
+    with open(GEOJSON_PATH) as f:
+        collection = json.load(f)
+    features = collection['features']
+    if tolerance > 0:
+        features = simplify_features(features, tolerance)
+    features = [{**f, 'geometry': {**f['geometry'], 'coordinates': _round(f['geometry']['coordinates'], precision)}}
+                for f in features]
+    body = json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':')).encode()
+    return body, hashlib.sha1(body).hexdigest()[:16]
+
+
+def geojson_url():
+    # the version in the query string lets browsers cache the file for good
+    _, etag = europe_geojson()
+    return f'{GEOJSON_ROUTE}?v={etag}'
+
+
+def init_geometry(server):
+    @server.route(GEOJSON_ROUTE)
+    def _europe_geojson():
+        body, etag = europe_geojson()
+        response = Response(body, mimetype='application/geo+json')
+        response.set_etag(etag)
+        if request.args.get('v') == etag:
+            response.cache_control.public = True
+            response.cache_control.max_age = 365 * 24 * 3600
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True  # revalidate, usually a 304
+        return response.make_conditional(request)
@@ -0,0 +1,151 @@
+# Indicator registry: everything the app knows about each dataset lives here.
+# The loader, the dropdowns, the color normalization and the map labels all read
+# from this table, so adding an indicator means adding one entry.
+#
+#   label    - dropdown label
+#   title    - axis / hover label
+#   axis     - 'x' (baseline dropdown) or 'y' (secondary dropdown)
+#   column   - name of the value column in the loaded frame
+#   source   - csv file in data/
+#   columns  - csv columns holding the country ('geo'), period ('period') and value ('value');
+#              wide tables (one column per year) only name 'geo'
+#   layout   - 'long' (default) or 'wide'
+#   period   - how to read the year: 'year', 'month' (2024-03) or 'date' (with date_format)
+#   agg      - 'mean' or 'sum' per (country, year)
+#   dtype    - dtype of the loaded values, 'float32' (default) or 'float64' where float32
+#              can't hold the data exactly (integer counts above 2**24)
+#   range    - (min, max) used to normalize values onto the color axes
+#   ticks    - legend tick values (x indicators)
+
+# standard Eurostat extract columns
+EUROSTAT = {'geo': 'geo', 'period': 'TIME_PERIOD', 'value': 'OBS_VALUE'}
+
+EPIDEMIC_COUNTRIES = [
+    'Austria', 'Belgium', 'Bulgaria', 'Croatia', 'Cyprus', 'Czech Republic',
+    'Denmark', 'Estonia', 'Finland', 'France', 'Germany', 'Greece', 'Hungary',
+    'Ireland', 'Italy', 'Latvia', 'Lithuania', 'Luxembourg', 'Malta',
+    'Netherlands', 'Poland', 'Portugal', 'Romania', 'Slovakia', 'Slovenia',
+    'Spain', 'Sweden', 'United Kingdom', 'Norway', 'Switzerland'
+]
+
+INDICATORS = {
+    'gdp_growth': {
+        'label': 'GDP Growth',
+        'title': 'GDP Growth (%)',
+        'axis': 'x',
+        'column': 'gdp_value',
+        'source': 'GDPGrowthData.csv',
+        'columns': EUROSTAT,
+        'period': 'year',
+        'agg': 'mean',
+        'range': (-10, 10),  # assume GDP Growth is in range -10 to 10
+        'ticks': [-10, -5, 0, 5, 10]
+    },
+    'gdp_per_capita': {
+        'label': 'GDP Per Capita',
+        'title': 'GDP Per Capita (Euro)',
+        'axis': 'x',
+        'column': 'gdp_per_capita',
+        'source': 'GDPPerCapitaData.csv',
+        'columns': EUROSTAT,
+        'period': 'year',
+        'agg': 'mean',
+        'range': (0, 90000),  # euro per capita
+        'ticks': [0, 22500, 45000, 67500, 90000]
+    },
+    'health': {
+        'label': 'Health Expenditure',
+        'title': 'Health Expenditure',
+        'axis': 'y',
+        'column': 'health_exp',
+        'source': 'HealthcareExpenditureData.csv',
+        'columns': EUROSTAT,
+        'period': 'year',
+        'agg': 'mean',
+        'range': (0, 10000)
+    },
+    'lifeexp': {
+        'label': 'Life Expectancy',
+        'title': 'Life Expectancy',
+        'axis': 'y',
+        'column': 'life_exp',
+        'source': 'LifeExpectancyData(1YO).csv',
+        'columns': EUROSTAT,
+        'period': 'year',
+        'agg': 'mean',
+        'range': (50, 90)
+    },
+    'epidemic': {
+        'label': 'Epidemic Cases',
+        'title': 'Epidemic Cases',
+        'axis': 'y',
+        'column': 'epidemic',
+        'source': 'EpidemicData.csv',
+        'columns': {'geo': 'country_extracted', 'period': 'date_extracted', 'value': 'cases_extracted'},
+        'period': 'date',
+        'date_format': '%Y/%m/%d',
+        'clean_country': True,  # "Reunion (France)" -> "France"
+        'countries': EPIDEMIC_COUNTRIES,
+        'agg': 'sum',
+        'range': (0, 300)
+    },
+    'econ': {
+        'label': 'Economic Sentiment',
+        'title': 'Economic Sentiment',
+        'axis': 'y',
+        'column': 'econ_sentiment',
+        'source': 'EconomicSentimentData.csv',
+        'columns': EUROSTAT,
+        'period': 'month',
+        'agg': 'mean',
+        'range': (50, 150)
+    },
+    'employment': {
+        'label': 'Employment Rate',
+        'title': 'Employment Rate',
+        'axis': 'y',
+        'column': 'employment_rate',
+        'source': 'EmploymentRateData.csv',
+        'columns': EUROSTAT,
+        'period': 'year',
+        'agg': 'mean',
+        'range': (50, 100)
+    },
+    'tourism': {
+        'label': 'Personal Tourism (%)',
+        'title': 'Personal Tourism (%)',
+        'axis': 'y',
+        'column': 'tourism_rate',
+        'source': 'PercentTourismContributing.csv',
+        'columns': {'geo': 'Country'},
+        'layout': 'wide',
+        'period': 'year',
+        'agg': 'mean',
+        'range': (0, 100)
+    },
+    'tourism_nights': {
+        'label': 'Tourism Nights',
+        'title': 'Tourism Nights',
+        'axis': 'y',
+        'column': 'tourism_nights',
+        'source': 'TourismNights.csv',
+        'columns': {'geo': 'NAME', 'period': 'YEAR', 'value': 'VALUE'},
+        'period': 'year',
+        'agg': 'mean',
+        'dtype': 'float64',  # hundreds of millions of nights
+        'range': (0, 500000000)
+    }
+}
+
+
+def get_indicator(key, axis=None):
+    # registry entry for key, None if unknown (or not on the requested axis)
+    spec = INDICATORS.get(key)
+    if spec is None or (axis is not None and spec['axis'] != axis):
+        return None
+    return spec
+
+
+def indicator_options(axis):
+    # dropdown options for one axis, in registry order
+    return [{'label': spec['label'], 'value': key} for key, spec in INDICATORS.items() if spec['axis'] == axis]
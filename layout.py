@@ -1,8 +1,15 @@
 from dash import dcc, html
+from classing import CLASSINGS, DEFAULT_CLASSING
+from indicators import indicator_options
 
 # reference: https://dash.plotly.com/dash-core-components
 
 YEARS = list(range(2015, 2025))
+DEFAULT_COUNTRY = 'DEU'  # time series shown until a country is clicked on the map
+
+X_VARIABLE_OPTIONS = indicator_options('x')
+SECONDARY_VARIABLE_OPTIONS = indicator_options('y')
+CLASSING_OPTIONS = [{'label': label, 'value': value} for value, label in CLASSINGS.items()]
 
 def get_layout():
     return html.Div([
@@ -10,10 +17,7 @@ def get_layout():
             "Bivariate Map: ",
             dcc.Dropdown( # dropdowns to select variables
                 id='x-variable-dropdown',
-                options=[
-                    {'label': 'GDP Growth', 'value': 'gdp_growth'},
-                    {'label': 'GDP Per Capita', 'value': 'gdp_per_capita'}
-                ],
+                options=X_VARIABLE_OPTIONS,
                 value='gdp_growth',
                 clearable=False,
                 style={
@@ -26,15 +30,7 @@ def get_layout():
             " vs ",
             dcc.Dropdown(
                 id='variable-dropdown',
-                options=[
-                    {'label': 'Health Expenditure', 'value': 'health'},
-                    {'label': 'Life Expectancy', 'value': 'lifeexp'},
-                    {'label': 'Epidemic Cases', 'value': 'epidemic'},
-                    {'label': 'Economic Sentiment', 'value': 'econ'},
-                    {'label': 'Employment Rate', 'value': 'employment'},
-                    {'label': 'Personal Tourism (%)', 'value': 'tourism'},
-                    {'label': 'Tourism Nights', 'value': 'tourism_nights'}
-                ],
+                options=SECONDARY_VARIABLE_OPTIONS,
                 value='health',
                 clearable=False,
                 style={
@@ -59,9 +55,51 @@ def get_layout():
             )
         ], style={'width': '60vw', 'maxWidth': '800px', 'margin': '20px 0', 'textAlign': 'left'}),
 
+        # how values are mapped onto the colors: registry ranges or data-driven classes
+        html.Div([
+            html.Label("Color classes:", style={'marginRight': '10px'}),
+            dcc.Dropdown(
+                id='classing-dropdown',
+                options=CLASSING_OPTIONS,
+                value=DEFAULT_CLASSING,
+                clearable=False,
+                style={'width': '260px', 'fontSize': '14px'}
+            )
+        ], style={'display': 'flex', 'alignItems': 'center', 'margin': '0 0 20px 0'}),
+
+        # every year of the selected variables, used when the browser switches years itself
+        dcc.Store(id='map-frames'),
+
+        # the year the legend shows, set only for per-year classings (assets/map_frames.js)
+        dcc.Store(id='legend-year'),
+
         # map + Legend side by side
         html.Div([
             dcc.Graph(id='choropleth-graph', style={'width': '45vw', 'minWidth': '300px', 'margin': '10px'}),
             dcc.Graph(id='legend-graph', style={'width': '45vw', 'minWidth': '300px', 'margin': '10px'})
+        ], style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center', 'alignItems': 'center'}),
+
+        # trends and correlations across the years (analytics.py)
+        html.H2("Trends and Correlations"),
+        html.Div([
+            dcc.RadioItems(
+                id='correlation-method',
+                options=[{'label': 'Pearson', 'value': 'pearson'}, {'label': 'Spearman', 'value': 'spearman'}],
+                value='pearson',
+                inline=True,
+                style={'marginRight': '30px'}
+            ),
+            dcc.RadioItems(
+                id='correlation-values',
+                options=[{'label': 'Values', 'value': 'level'}, {'label': 'Yearly changes', 'value': 'change'}],
+                value='level',
+                inline=True
+            )
+        ], style={'display': 'flex', 'flexWrap': 'wrap'}),
+
+        # heatmap + time series of the country clicked on the map
+        html.Div([
+            dcc.Graph(id='correlation-graph', style={'width': '45vw', 'minWidth': '300px', 'margin': '10px'}),
+            dcc.Graph(id='time-series-graph', style={'width': '45vw', 'minWidth': '300px', 'margin': '10px'})
         ], style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center', 'alignItems': 'center'})
     ])
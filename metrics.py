@@ -0,0 +1,159 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+# Minimal in-process metrics with a Prometheus text endpoint.
+# Every gunicorn worker keeps (and reports) its own numbers.
+
+# latency buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99)
+RECENT_SAMPLES = 1024  # samples kept per series for the quantiles
+
+HELP = {
+    'dashboard_loader_seconds': "Time to load one indicator (snapshot or csv) on a cache miss",
+    'dashboard_loader_parse_seconds': "Time spent parsing the source csv of one indicator",
+    'dashboard_stage_seconds': "Time spent in each stage of the figure callbacks",
+    'dashboard_request_seconds': "Time to serve an HTTP request, including Dash's JSON encoding",
+    'dashboard_response_bytes_total': "Bytes sent in HTTP responses",
+    'dashboard_cache_requests_total': "Cache lookups by cache and result",
+    'dashboard_reload_seconds': "Time to hot-reload changed data files, figures included",
+    'dashboard_data_reloads_total': "Hot reloads of each indicator's data",
+    'dashboard_single_flight_waits_total': "Figure requests that waited for an identical one already rendering",
+}
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> Histogram
+_counters = {}    # (name, labels) -> float
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self):
+        values = sorted(self.recent)
+        if not values:
+            return []
+        return [(q, values[min(int(q * len(values)), len(values) - 1)]) for q in QUANTILES]
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    with _lock:
+        hist = _histograms.get(_key(name, labels))
+        if hist is None:
+            hist = _histograms[_key(name, labels)] = Histogram()
+        hist.observe(value)
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def timed(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def render():
+    # Prometheus text exposition format: histograms (with buckets) and counters,
+    # plus a <name>_recent summary with quantiles over the last RECENT_SAMPLES samples
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+
+        seen = set()
+        for (name, labels), hist in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} histogram')
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {hist.sum}')
+            lines.append(f'{name}_count{_format_labels(labels)} {hist.count}')
+
+        seen = set()
+        for (name, labels), hist in histograms:
+            summary = name + '_recent'
+            if summary not in seen:
+                seen.add(summary)
+                lines.append(f'# HELP {summary} Quantiles of {name} over the last {RECENT_SAMPLES} samples')
+                lines.append(f'# TYPE {summary} summary')
+            for q, value in hist.quantiles():
+                lines.append(f'{summary}{_format_labels(labels, [("quantile", q)])} {value}')
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(server, path='/metrics'):
+    # time every request (Dash callbacks are POSTs to /_dash-update-component)
+    # and serve the collected metrics on `path`
+    @server.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None and request.path != path:
+            # label by route rule, not raw path, to keep the number of series bounded
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            observe('dashboard_request_seconds', time.perf_counter() - start, route=route)
+            if not response.direct_passthrough:
+                inc('dashboard_response_bytes_total', response.calculate_content_length() or 0, route=route)
+        return response
+
+    @server.route(path)
+    def _metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+from flask import Response, g, request
+from indicators import INDICATORS
+from versions import indicator_versions
+
+try:
+    import brotli
+except ImportError:  # optional, responses are gzipped only
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # optional, plotly falls back to the json module
+    orjson = None
+
+# Response compression and conditional requests for the Flask server.
+#
+# Text responses are compressed with brotli (if installed) or gzip, whichever the client
+# accepts. GET responses get a content-hash ETag and a 304 when the client has it.
+#
+# CALLBACK_ETAGS=1 also gives callback responses (POST /_dash-update-component) an ETag
+# computed from the request body (the callback and its inputs) and the data versions, and
+# answers a matching If-None-Match with a 304 without running the callback. This only
+# helps custom API clients that replay callbacks and send the tag themselves: browsers
+# never send If-None-Match on the renderer's fetch POSTs and proxies don't cache POSTs,
+# so the dashboard itself never gets one of these 304s. Off by default.
+
+CALLBACK_ROUTE = '_dash-update-component'
+CALLBACK_ETAGS = os.environ.get('CALLBACK_ETAGS', '').lower() in ('1', 'true')
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # bytes, smaller ones aren't worth it
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+COMPRESSIBLE = {
+    'application/json', 'application/geo+json', 'application/javascript',
+    'text/javascript', 'text/css', 'text/html', 'text/plain'
+}
+
+# compressed bodies of GET responses (dash's javascript bundles are megabytes), by etag
+_compressed = OrderedDict()
+_compressed_lock = threading.Lock()
+COMPRESSED_CACHE_SIZE = 32
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def _compress_cached(etag, data, encoding):
+    key = (etag, encoding)
+    with _compressed_lock:
+        body = _compressed.get(key)
+        if body is not None:
+            _compressed.move_to_end(key)
+            return body
+    body = compress(data, encoding)
+    with _compressed_lock:
+        _compressed[key] = body
+        while len(_compressed) > COMPRESSED_CACHE_SIZE:
+            _compressed.popitem(last=False)
+    return body
+
+
+def code_fingerprint():
+    # changes with every deploy, so a new release never answers 304 for an old response
+    root = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in ('data', '__pycache__')]
+        for name in sorted(filenames):
+            if name.endswith(('.py', '.js', '.css')):
+                st = os.stat(os.path.join(dirpath, name))
+                h.update(f'{name}:{st.st_mtime_ns}:{st.st_size};'.encode())
+    return h.hexdigest()[:16]
+
+
+def callback_etag(body, salt=''):
+    # same callback, same inputs, same data -> same response
+    versions = json.dumps(sorted(indicator_versions(INDICATORS).items())).encode()
+    return hashlib.sha1(salt.encode() + b'\0' + versions + b'\0' + body).hexdigest()[:32]
+
+
+def is_background_job(response):
+    # background callbacks (BACKGROUND_CALLBACKS) answer with a job handle first, a different
+    # one every time, and the result comes from polling: neither is worth an etag
+    return 'cacheKey' in request.args or response.get_data()[:12] == b'{"cacheKey":'
+
+
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+    etag, _ = response.get_etag()
+    if request.method == 'GET' and etag:
+        body = _compress_cached(etag, data, encoding)
+    else:
+        body = compress(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # same content, different bytes: the etag only holds for weak comparison now
+        # (which is what If-None-Match uses)
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_responses(server, salt=''):
+    # salt: anything besides the data and the code that changes what a callback returns
+    salt = f'{code_fingerprint()}:{salt}'
+    if orjson is not None:
+        pio.json.config.default_engine = 'orjson'  # used by dash to encode callback output
+
+    @server.before_request
+    def _conditional_callback():
+        if (not CALLBACK_ETAGS or request.method != 'POST' or not request.path.endswith(CALLBACK_ROUTE)
+                or 'cacheKey' in request.args):
+            return None
+        etag = callback_etag(request.get_data(), salt)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        g.callback_etag = etag
+        return None
+
+    @server.after_request
+    def _finish_response(response):
+        etag = g.pop('callback_etag', None)
+        if etag is not None:
+            if response.status_code == 200 and not is_background_job(response):
+                response.set_etag(etag)
+                response.cache_control.no_cache = True
+        elif request.method == 'GET' and response.status_code == 200 and not response.direct_passthrough:
+            if not response.get_etag()[0]:
+                response.add_etag()
+            response = response.make_conditional(request)
+        return compress_response(response)
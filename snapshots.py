@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# base directory for the raw csv files and where the compiled snapshots live
+# (DATA_DIR points the app at another copy of the data, e.g. the benchmark's scaled csvs)
+BASE_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(BASE_DIR, ".snapshots"))
+
+# bump this whenever a loader changes how it parses its csv, so old snapshots get rebuilt
+SNAPSHOT_VERSION = 3
+
+
+def source_signature(path):
+    # cheap change check: modification time + size of the source file
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _meta_path(stem):
+    return os.path.join(SNAPSHOT_DIR, stem + '.json')
+
+
+def _column_path(stem, token, column):
+    return os.path.join(SNAPSHOT_DIR, f'{stem}-{token}.{column}.npy')
+
+
+def _read_meta(stem):
+    try:
+        with open(_meta_path(stem)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, mode, write):
+    # write(f) into a temp file of its own (two threads or processes may build the same
+    # snapshot at once), then move it into place: readers never see half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _write_json(path, data):
+    _write_atomic(path, 'w', lambda f: json.dump(data, f))
+
+
+def _open_snapshot(stem, meta):
+    # memory-map every column, nothing is parsed here; numeric and category columns stay
+    # views on the maps (text becomes python strings, which can't be mapped)
+    columns = {}
+    for name, _, *categories in meta['columns']:
+        arr = np.load(_column_path(stem, meta['token'], name), mmap_mode='r')
+        columns[name] = pd.Categorical.from_codes(arr, categories[0]) if categories else arr
+    return pd.DataFrame(columns, copy=False)
+
+
+def _write_snapshot(stem, df, meta):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    columns = []
+    for name in df.columns:
+        col = df[name]
+        entry = []
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            # categoricals keep their codes on disk, the categories go into the meta file
+            arr = col.cat.codes.to_numpy()
+            entry = [col.cat.categories.tolist()]
+        elif pd.api.types.is_numeric_dtype(col):
+            arr = col.to_numpy()
+        else:
+            # text columns are stored as fixed-width unicode so they can be mmapped
+            arr = col.fillna('').astype(str).to_numpy().astype('U')
+        path = _column_path(stem, meta['token'], name)
+        _write_atomic(path, 'wb', lambda f: np.save(f, arr))
+        columns.append([name, arr.dtype.str] + entry)
+    meta['columns'] = columns
+    meta['rows'] = len(df)
+    _write_json(_meta_path(stem), meta)
+
+    # drop column files from older builds of the same source
+    pattern = re.compile(re.escape(stem) + r'-([0-9a-f]{16})\..+\.npy')
+    for name in os.listdir(SNAPSHOT_DIR):
+        match = pattern.fullmatch(name)
+        if match and match.group(1) != meta['token']:
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, name))
+            except OSError:
+                pass
+
+def load_snapshot(filename, parse, build=None):
+    # return the parsed frame for data/<filename>, compiling a snapshot if needed;
+    # build describes how the frame is parsed, a snapshot made differently is rebuilt
+    build = f'{build or parse.__qualname__}:{SNAPSHOT_VERSION}'
+    path = os.path.join(BASE_DIR, filename)
+    stem = os.path.splitext(filename)[0]
+    signature = source_signature(path)
+    meta = _read_meta(stem)
+
+    if meta is not None and meta.get('version') == SNAPSHOT_VERSION and meta.get('build') == build:
+        try:
+            if meta['signature'] == signature:
+                return _open_snapshot(stem, meta)
+            # mtime moved (e.g. a fresh checkout), only rebuild if the content changed
+            if meta['sha1'] == _file_hash(path):
+                df = _open_snapshot(stem, meta)
+                meta['signature'] = signature
+                _write_json(_meta_path(stem), meta)
+                return df
+        except (OSError, ValueError, KeyError):
+            logger.warning("snapshot for %s is unreadable, rebuilding", filename)
+
+    df = parse(path)
+    # rows without an iso code can never be matched on the map, don't store them
+    if 'iso_alpha' in df.columns:
+        df = df[df['iso_alpha'].notnull()].reset_index(drop=True)
+
+    sha1 = _file_hash(path)
+    token = hashlib.sha1(f'{sha1}:{build}'.encode()).hexdigest()[:16]
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'source': filename,
+        'signature': signature,
+        'sha1': sha1,
+        'build': build,
+        'token': token,
+    }
+    try:
+        _write_snapshot(stem, df, meta)
+        return _open_snapshot(stem, meta)
+    except OSError as e:
+        # read-only data dir etc. - still serve the parsed frame
+        logger.warning("could not write snapshot for %s: %s", filename, e)
+        return df
+
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from flask import Flask
+
+from analytics import clamp_years, init_analytics
+from cache import cache, get_cache_config
+
+CUBE = SimpleNamespace(years=np.array([1996, 1997, 1999, 2000, 2001]))
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (None, None, (1996, 2001)),
+    (1997, 2000, (1997, 2000)),
+    # partly outside: only the ends are clamped
+    (1990, 1997, (1996, 1997)),
+    (1999, 2030, (1999, 2001)),
+    (None, 1999, (1996, 1999)),
+    # the range starts or ends in a gap
+    (1998, 2000, (1999, 2000)),
+])
+def test_clamp_years_overlapping(start, end, expected):
+    assert clamp_years(CUBE, start, end) == expected
+
+
+@pytest.mark.parametrize('start, end', [
+    (2030, 2035),   # after the data
+    (None, 1900),
+    (1900, 1901),   # before the data
+    (1998, 1998),   # only a year the data doesn't have
+    (2000, 1997),   # start after end
+])
+def test_clamp_years_outside(start, end):
+    assert clamp_years(CUBE, start, end) is None
+
+
+@pytest.fixture(scope='module')
+def client():
+    server = Flask(__name__)
+    cache.init_app(server, config=get_cache_config())
+    init_analytics(server)
+    return server.test_client()
+
+
+@pytest.mark.parametrize('query', ['start=2030&end=2035', 'end=1900', 'start=1900&end=1901', 'start=2020&end=2016'])
+def test_correlations_outside_the_data(client, query):
+    assert client.get(f'/api/correlations?{query}').status_code == 400
+
+
+def test_correlations_partly_outside_the_data(client):
+    full = client.get('/api/correlations').get_json()['years']
+    response = client.get(f'/api/correlations?start=1900&end={full[0] + 2}')
+    assert response.status_code == 200
+    assert response.get_json()['years'] == [full[0], full[0] + 2]
+    response = client.get(f'/api/correlations?start={full[1] - 1}&end=3000')
+    assert response.get_json()['years'] == [full[1] - 1, full[1]]
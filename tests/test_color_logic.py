@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from color_logic import bilinear_interpolate, compute_colors, compute_final_color
+
+# The single-value path as it was before the vectorized engine (ranges hard-coded),
+# compute_colors and compute_final_color must give exactly the same colors.
+X_RANGES = {'gdp_growth': (-10, 10), 'gdp_per_capita': (0, 90000)}
+SECONDARY_RANGES = {
+    'health': (0, 10000),
+    'lifeexp': (50, 90),
+    'epidemic': (0, 300),
+    'econ': (50, 150),
+    'employment': (50, 100),
+    'tourism': (0, 100),
+    'tourism_nights': (0, 500000000),
+}
+
+
+def reference_color(x_val, other, x_var, secondary):
+    if x_var in X_RANGES:
+        x_min, x_max = X_RANGES[x_var]
+        x_norm = (x_val - x_min) / (x_max - x_min)
+    else:
+        x_norm = 0
+    x_norm = min(max(x_norm, 0), 1)
+    other_min, other_max = SECONDARY_RANGES.get(secondary, (0, 1))
+    y_norm = (other - other_min) / (other_max - other_min)
+    y_norm = min(max(y_norm, 0), 1)
+    r, g, b = bilinear_interpolate(x_norm, y_norm, (255, 255, 255), (0, 0, 255), (255, 0, 0), (255, 0, 255))
+    r, g, b = (min(max(c, 0), 255) for c in (r, g, b))
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def sample_values(low, high, rng):
+    span = high - low
+    values = [
+        low, high, (low + high) / 2,               # boundaries and the middle
+        low - span, high + span, low - 1, high + 1,  # out of range
+    ]
+    # values whose channels land on .5 before rounding (255 * k / 510 steps)
+    values += [low + span * k / 510 for k in (1, 3, 255, 509)]
+    values += list(rng.uniform(low - span / 4, high + span / 4, 40))
+    return np.array(values, dtype=float)
+
+
+@pytest.mark.parametrize('x_var', [*X_RANGES, 'unknown'])
+@pytest.mark.parametrize('secondary', [*SECONDARY_RANGES, 'unknown'])
+def test_compute_colors_matches_single_value_path(x_var, secondary):
+    rng = np.random.default_rng(0)
+    x_low, x_high = X_RANGES.get(x_var, (0, 1))
+    y_low, y_high = SECONDARY_RANGES.get(secondary, (0, 1))
+    xs, ys = np.meshgrid(sample_values(x_low, x_high, rng), sample_values(y_low, y_high, rng))
+    xs, ys = xs.ravel(), ys.ravel()
+
+    expected = [reference_color(x, y, x_var, secondary) for x, y in zip(xs, ys)]
+    assert compute_colors(xs, ys, x_var=x_var, secondary=secondary).tolist() == expected
+    assert [compute_final_color(x, y, x_var, secondary) for x, y in zip(xs[:50], ys[:50])] == expected[:50]
+
+
+def test_half_channels_round_to_even():
+    # x in the middle: red and green are 127.5 and round() makes them 128;
+    # x a quarter in: 191.25 -> 191
+    assert compute_final_color(0, 0, 'gdp_growth', 'health') == '#8080ff'
+    assert compute_final_color(-5, 0, 'gdp_growth', 'health') == '#bfbfff'
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from indicators import INDICATORS
+from snapshots import BASE_DIR, SNAPSHOT_VERSION, source_signature
+
+# Per-indicator data versions. A version is a short token over the source csv's
+# signature and the registry entry; the loader, cube and figure caches are keyed by
+# them, so a changed file never hits entries built from the old one.
+#
+# Without a watcher the version is read from disk on every lookup. Once a watcher
+# (see watcher.py) publishes versions, requests keep using the published ones until it
+# has rebuilt everything for a changed file and publishes the new version.
+
+_published = {}  # indicator -> version, replaced as a whole on publish
+_pending = ContextVar('pending_versions', default=None)
+
+
+def indicator_build(key):
+    # how the indicator is parsed, a snapshot made differently is rebuilt
+    return 'read_indicator:' + json.dumps(INDICATORS[key], sort_keys=True)
+
+
+def disk_version(key):
+    path = os.path.join(BASE_DIR, INDICATORS[key]['source'])
+    try:
+        signature = source_signature(path)
+    except OSError:
+        signature = None
+    payload = json.dumps([SNAPSHOT_VERSION, indicator_build(key), signature]).encode()
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def indicator_version(key):
+    pending = _pending.get()
+    if pending is not None and key in pending:
+        return pending[key]
+    version = _published.get(key)
+    return disk_version(key) if version is None else version
+
+
+def indicator_versions(keys):
+    return {key: indicator_version(key) for key in keys}
+
+
+def publish(versions):
+    # make versions visible to every thread at once
+    global _published
+    _published = {**_published, **versions}
+
+
+@contextmanager
+def pending_versions(versions):
+    # use versions in the current thread (only) before they are published,
+    # so a rebuild can fill the caches for them while requests still see the old data
+    token = _pending.set(versions)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
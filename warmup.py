@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import Flask
+
+import data_loaders
+from cache import FIGURE_FUNCS, cache, get_cache_config
+from classing import DEFAULT_CLASSING
+from color_logic import cached_2d_legend_figure, cached_bivariate_map
+from data_cube import get_data_cube
+from indicators import INDICATORS
+from layout import SECONDARY_VARIABLE_OPTIONS, X_VARIABLE_OPTIONS, YEARS
+
+logger = logging.getLogger(__name__)
+
+# flask app used by the pool processes so cache.memoize has an app context
+_worker_app = None
+
+
+def _init_worker(config):
+    global _worker_app
+    _worker_app = Flask(__name__)
+    cache.init_app(_worker_app, config=config)
+
+
+def _run_loader(key):
+    with _worker_app.app_context():
+        _, timings, errors = data_loaders.load_all([key])
+    return key, timings[key], errors.get(key)
+
+
+def _render_figure(args):
+    # args is ('map', x_var, secondary_var, year, classing) or
+    # ('legend', x_var, secondary_var, classing, year), the arguments the callbacks pass
+    kind, *fig_args = args
+    cached = cached_bivariate_map if kind == 'map' else cached_2d_legend_figure
+    with _worker_app.app_context():
+        return cached.cache_key(*fig_args), cached.render(*fig_args)
+
+
+def figure_jobs():
+    jobs = []
+    for x in X_VARIABLE_OPTIONS:
+        for secondary in SECONDARY_VARIABLE_OPTIONS:
+            jobs.append(('legend', x['value'], secondary['value'], DEFAULT_CLASSING, None))
+            jobs.extend(('map', x['value'], secondary['value'], year, DEFAULT_CLASSING) for year in YEARS)
+    return jobs
+
+
+def warm_up(render_figures=False, processes=None):
+    # load every dataset (and optionally render every figure) before serving traffic;
+    # must run inside an app context, returns the time spent per stage in seconds
+    timings = {}
+    config = get_cache_config()
+    total_start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(config,)) as pool:
+        # 1. parse the csvs in parallel, this (re)builds any stale snapshot on disk
+        start = time.perf_counter()
+        for key, seconds, error in pool.map(_run_loader, INDICATORS):
+            logger.info("warm-up: parsing %s took %.3fs%s", key, seconds, " (failed)" if error else "")
+        timings['parse'] = time.perf_counter() - start
+
+        # 2. fill this process's cache from the fresh snapshots
+        start = time.perf_counter()
+        data_loaders.load_all()
+        get_data_cube()
+        timings['load'] = time.perf_counter() - start
+        for key, usage in data_loaders.memory_report().items():
+            logger.info("warm-up: %s holds %d rows in %d bytes (%d bytes cached)",
+                        key, usage['rows'], usage['bytes'], usage['cache_bytes'])
+
+        # 3. optionally render every map and legend and seed the figure cache
+        if render_figures:
+            start = time.perf_counter()
+            # the keys carry the data versions the figures were rendered from
+            for key, fig_json in pool.map(_render_figure, figure_jobs(), chunksize=4):
+                FIGURE_FUNCS[key[0]].store.set(key, fig_json)
+            timings['figures'] = time.perf_counter() - start
+
+    timings['total'] = time.perf_counter() - total_start
+    for stage, seconds in timings.items():
+        logger.info("warm-up: %s stage took %.3fs", stage, seconds)
+    return timings
+
+
+def warm_up_from_env(server):
+    # WARMUP=1 loads every dataset before serving, WARMUP=figures also renders every figure;
+    # WARMUP_PROCESSES caps the pool size (defaults to the cpu count)
+    mode = os.environ.get('WARMUP', '').lower()
+    if mode not in ('1', 'true', 'figures'):
+        return None
+    processes = int(os.environ.get('WARMUP_PROCESSES', 0)) or None
+    with server.app_context():
+        return warm_up(render_figures=(mode == 'figures'), processes=processes)
@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+import time
+
+from cache import cache, discard_figures, figure_dependents
+from data_cube import _get_data_cube, get_data_cube
+from data_loaders import _load_indicator, load_all
+from indicators import INDICATORS
+from metrics import inc, observe
+from versions import disk_version, indicator_versions, pending_versions, publish
+
+logger = logging.getLogger(__name__)
+
+
+class DataWatcher(threading.Thread):
+    # Polls the source csvs and hot-reloads the indicators whose file changed:
+    #   1. load the changed datasets (csv parse + snapshot) for their new versions
+    #   2. build the data cube for the new versions
+    #   3. render again every cached figure that shows a changed indicator
+    #   4. publish the new versions, all at once
+    #   5. drop the old figures and cache entries
+    # Until step 4 requests keep being served from the old data, after it every figure
+    # they ask for that was cached before is already there, so nobody waits on a reload.
+    def __init__(self, server, interval=2.0):
+        super().__init__(name='data-watcher', daemon=True)
+        self.server = server
+        self.interval = interval
+        self.stopped = threading.Event()
+        self._failed = {}  # indicator -> version that failed to load, not retried
+
+    def run(self):
+        # from here on requests use the published versions instead of reading them from disk
+        publish({key: disk_version(key) for key in INDICATORS})
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("data reload failed")
+
+    def stop(self):
+        self.stopped.set()
+
+    def check(self):
+        # reload whatever changed since the last check, returns the new versions
+        current = indicator_versions(INDICATORS)
+        changed = {}
+        for key in INDICATORS:
+            version = disk_version(key)
+            if version != current[key] and self._failed.get(key) != version:
+                changed[key] = version
+        if changed:
+            self.reload(changed, current)
+        return changed
+
+    def reload(self, changed, current):
+        start = time.perf_counter()
+        versions = {**current, **changed}
+        with self.server.app_context(), pending_versions(versions):
+            _, _, errors = load_all(changed, versions=versions)
+            for key, error in errors.items():
+                # keep serving the last good data until the file changes again
+                logger.error("reloading %s failed, keeping the previous data: %r", key, error)
+                self._failed[key] = changed.pop(key)
+                versions[key] = current[key]
+            if not changed:
+                return
+
+            get_data_cube()
+            for cached, args in figure_dependents(changed):
+                cached(*args)
+
+        publish(changed)
+        for key in changed:
+            self._failed.pop(key, None)
+        logger.info("reloaded %s in %.3fs", ', '.join(sorted(changed)), time.perf_counter() - start)
+        observe('dashboard_reload_seconds', time.perf_counter() - start)
+        for key in changed:
+            inc('dashboard_data_reloads_total', indicator=key)
+
+        # nothing asks for the old versions any more
+        dropped = discard_figures(
+            lambda fig_key: any(key in changed and version != changed[key] for key, version in fig_key[2])
+        )
+        logger.info("dropped %d figures built from the old data", dropped)
+        with self.server.app_context():
+            for key in changed:
+                cache.delete_memoized(_load_indicator, key, current[key])
+            cache.delete_memoized(_get_data_cube, tuple(current.items()))
+
+
+_watcher = None
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+
+
+def start_watcher(server, interval=2.0):
+    # one watcher per process; after a fork (gunicorn workers) the child starts its own
+    global _watcher, _watcher_pid
+    if _watcher_pid == os.getpid():
+        return _watcher
+    with _watcher_lock:
+        if _watcher is None or _watcher_pid != os.getpid():
+            _watcher = DataWatcher(server, interval)
+            _watcher_pid = os.getpid()
+            _watcher.start()
+        return _watcher
+
+
+def init_watcher(server):
+    # DATA_WATCH=1 hot-reloads changed csvs in data/ every DATA_WATCH_INTERVAL seconds (2);
+    # the thread starts with the first request so each gunicorn worker gets its own
+    if os.environ.get('DATA_WATCH', '').lower() not in ('1', 'true'):
+        return
+    interval = float(os.environ.get('DATA_WATCH_INTERVAL', 2))
+
+    @server.before_request
+    def _ensure_watcher():
+        start_watcher(server, interval)